@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import argparse
+import ast
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import numpy as np
+
+import npfilters
+import npimage
+from npfilelist import folder_files, IMAGE_EXTENSIONS
+from npmemory import physical_memory
+
+'''
+headless batch processing - apply recipe to images matching glob,
+no tkinter or matplotlib imported (servers without display)
+
+recipe: json list of steps {"op": name, "args": [...], "kwargs": {...}},
+op is npImage method (IMAGE_OPS) or npfilters filter (FILTER_OPS),
+optional "selection": [row0, row1, col0, col1] - step edits only this box
+(crop: image is cropped to it),
+recipes can be recorded in npyshop (Macro menu)
+steps may be given as calls on command line: -s "gamma(.8)" -s "rotate(1)"
+
+files are processed in pool of processes, images in progress
+are kept under memory ceiling by estimates from file headers
+
+    npbatch "photos/*.jpg" -r recipe.json -o processed
+    npbatch "scans/*.tif" -s "normalize()" -s "unsharp_mask(2, .3)" --suffix _sharp
+    npbatch --dir scans -r recipe.json -o processed -j 8 --max-memory 4000
+'''
+
+IMAGE_OPS = ("rotate", "flip", "mirror", "crop", "free_rotate", "resize", "rgb2gray",
+             "fft_filter")
+FILTER_OPS = ("invert", "normalize", "equalize", "adaptive_equalize", "gamma",
+              "contrast", "multiply", "add", "fill", "sigmoid", "logit",
+              "tres_high", "tres_low", "clip_high", "clip_low",
+              "gaussian", "blur", "unsharp_mask", "high_pass")
+WORK_COPIES = 4  # float64 copies of image alive while filtering (estimate)
+MEMORY_FRACTION = .5  # default memory ceiling, part of physical memory
+
+
+def parse_step(text):
+    ''' "op(arg, key=value)" -> step, only literal arguments '''
+    try:
+        call = ast.parse(text.strip(), mode='eval').body
+        if isinstance(call, ast.Name):  # op without parentheses
+            return {"op": call.id, "args": [], "kwargs": {}}
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)):
+            raise ValueError("not a call")
+        return {"op": call.func.id,
+                "args": [ast.literal_eval(a) for a in call.args],
+                "kwargs": {k.arg: ast.literal_eval(k.value) for k in call.keywords},
+                }
+    except (SyntaxError, ValueError) as e:
+        raise ValueError(f"invalid step {text!r}: {e}")
+
+
+def format_step(step):
+    ''' step -> "op(arg, key=value)" '''
+    params = [repr(a) for a in step.get("args", [])]
+    params += [f"{k}={v!r}" for k, v in step.get("kwargs", {}).items()]
+    return f"{step['op']}({', '.join(params)})"
+
+
+def validate(recipe):
+    ''' fail before any image is processed '''
+    for step in recipe:
+        op = step["op"]
+        if op not in IMAGE_OPS and op not in FILTER_OPS:
+            raise ValueError(f"unknown operation: {op}")
+    return recipe
+
+
+def load_recipe(fpath):
+    with open(fpath) as f:
+        return validate(json.load(f))
+
+
+def save_recipe(recipe, fpath):
+    with open(fpath, "w") as f:
+        json.dump(recipe, f, indent=1)
+
+
+def apply_step(img, step):
+    op, args, kwargs = step["op"], step.get("args", []), step.get("kwargs", {})
+    sel = step.get("selection")
+    if sel:
+        img.slice = np.s_[sel[0]:sel[1], sel[2]:sel[3], ...]
+    try:
+        if op in IMAGE_OPS:
+            getattr(img, op)(*args, **kwargs)
+        else:
+            func = getattr(npfilters, op)
+            img.set_selection(func(img.get_selection(), *args, **kwargs))
+    finally:
+        img.slice = np.s_[:, :, ...]
+
+
+def apply_recipe(img, recipe):
+    for step in recipe:
+        logging.debug(f"{img.fpath}: {format_step(step)}")
+        apply_step(img, step)
+
+
+def output_path(fpath, out_dir=None, suffix="", ext=None):
+    Fp = Path(fpath)
+    out_dir = Path(out_dir) if out_dir else Fp.parent
+    return out_dir / f"{Fp.stem}{suffix}{ext or Fp.suffix}"
+
+
+def process_file(fpath, recipe, out_dir=None, suffix="", ext=None):
+    ''' load, apply recipe, save - returns output path '''
+    img = npimage.npImage(img_path=fpath)
+    apply_recipe(img, recipe)
+    out = output_path(fpath, out_dir, suffix, ext)
+    img.save(out)
+    return out
+
+
+def find_files(patterns, folders=()):
+    files = []
+    for pattern in patterns:
+        files += sorted(glob.glob(pattern, recursive=True))
+    for folder in folders:
+        files += folder_files(folder, IMAGE_EXTENSIONS)
+    return files
+
+
+def probe(fpath):
+    ''' rows, cols, channels, bytes per sample - from file header only '''
+    from PIL import Image
+    with Image.open(fpath) as im:
+        w, h = im.size
+        mode = im.mode
+        channels = len(im.getbands())
+    itemsize = 2 if mode.startswith("I;16") else 4 if mode in ("I", "F") else 1
+    return h, w, channels, itemsize
+
+
+def estimate_memory(fpath):
+    ''' bytes needed to process image: decoded + float working copies '''
+    h, w, channels, itemsize = probe(fpath)
+    return h * w * channels * (itemsize + 8 * WORK_COPIES)
+
+
+def _timed_process(fpath, recipe, out_dir, suffix, ext):
+    ''' runs in worker process '''
+    t0 = time.perf_counter()
+    out = process_file(fpath, recipe, out_dir, suffix, ext)
+    return str(out), time.perf_counter() - t0
+
+
+def run_pool(files, recipe, out_dir=None, suffix="", ext=None,
+             jobs=None, max_memory=None, on_result=None):
+    ''' process files in pool of processes,
+    worker count from largest memory estimate and max_memory (bytes),
+    memory estimates of running files together stay under max_memory,
+    returns result dict of each file: file, out, seconds, memory, error '''
+    max_memory = max_memory or physical_memory() * MEMORY_FRACTION
+    results, estimates = [], {}
+
+    def report(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    for fpath in files:
+        try:
+            estimates[fpath] = estimate_memory(fpath)
+        except Exception as e:  # not an image
+            report({"file": fpath, "out": None, "seconds": 0, "memory": None,
+                    "error": f"{type(e).__name__}: {e}"})
+    if not estimates:
+        return results
+
+    largest = max(estimates.values())
+    workers = int(max(1, min(jobs or os.cpu_count() or 1, len(estimates),
+                             max_memory // largest)))
+    logging.info(f"{workers} workers, largest image {largest / 2**20:.0f} MB, "
+                 f"memory ceiling {max_memory / 2**20:.0f} MB")
+    if largest > max_memory:
+        logging.warning(f"largest image needs {largest / 2**20:.0f} MB, over memory ceiling")
+
+    pending = deque(estimates)
+    running = {}  # future: file
+    used = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            while (pending and len(running) < workers
+                   and (not running or used + estimates[pending[0]] <= max_memory)):
+                fpath = pending.popleft()
+                used += estimates[fpath]
+                running[pool.submit(_timed_process, fpath, recipe,
+                                    out_dir, suffix, ext)] = fpath
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                fpath = running.pop(future)
+                used -= estimates[fpath]
+                result = {"file": fpath, "out": None, "seconds": None,
+                          "memory": estimates[fpath], "error": None}
+                try:
+                    result["out"], result["seconds"] = future.result()
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                report(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="npbatch", description="apply recipe of npyshop operations to images")
+    parser.add_argument("patterns", nargs="*", help="image files glob, eg. 'photos/*.jpg'")
+    parser.add_argument("-d", "--dir", action="append", default=[],
+                        help="process all images in folder")
+    parser.add_argument("-r", "--recipe", help="recipe json file")
+    parser.add_argument("-s", "--step", action="append", default=[],
+                        help="operation call, eg. 'gamma(.8)', applied after recipe")
+    parser.add_argument("-o", "--out-dir", help="output folder (default: next to input)")
+    parser.add_argument("--suffix", default="", help="appended to output file name")
+    parser.add_argument("--ext", help="output extension, eg. .png (default: as input)")
+    parser.add_argument("-j", "--jobs", type=int, help="max worker processes (default: cores)")
+    parser.add_argument("--max-memory", type=float,
+                        help=f"MB for images in progress (default: {MEMORY_FRACTION:.0%} of RAM)")
+    parser.add_argument("--report", help="json file with per file timings and failures")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(message)s')
+
+    recipe = load_recipe(args.recipe) if args.recipe else []
+    recipe += validate([parse_step(s) for s in args.step])
+    if not recipe:
+        parser.error("empty recipe, use --recipe or --step")
+
+    files = find_files(args.patterns, args.dir)
+    if not files:
+        parser.error("no files found")
+    inputs = {Path(f).resolve() for f in files}
+    overwritten = [f for f in files
+                   if output_path(f, args.out_dir, args.suffix, args.ext).resolve() in inputs]
+    if overwritten:
+        parser.error(f"inputs would be overwritten ({overwritten[0]} ...), "
+                     "use --out-dir, --suffix or --ext")
+    print(f"{len(files)} files, recipe: {' > '.join(format_step(s) for s in recipe)}")
+
+    def show(result):
+        if result["error"]:
+            print(f"FAILED {result['file']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['file']} -> {result['out']} {result['seconds']:.2f}s")
+
+    t0 = time.perf_counter()
+    max_memory = args.max_memory * 2 ** 20 if args.max_memory else None
+    results = run_pool(files, recipe, args.out_dir, args.suffix, args.ext,
+                       jobs=args.jobs, max_memory=max_memory, on_result=show)
+    failed = [r for r in results if r["error"]]
+    busy = sum(r["seconds"] or 0 for r in results)
+    print(f"done {len(results) - len(failed)}, failed {len(failed)}, "
+          f"{time.perf_counter() - t0:.1f}s (processing {busy:.1f}s)")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+'''
+decoded images kept for reopening (load_previous, contact sheet ...),
+entries are valid while file path, mtime and size are unchanged
+
+RAM: least recently used arrays up to byte limit
+disk (optional): raw decoded arrays as .npy, reopened memory mapped
+'''
+
+CACHE_DIR = Path.home() / ".cache" / "npyshop" / "decoded"
+
+
+def fingerprint(fpath):
+    ''' file identity - changes when file is edited or replaced '''
+    st = os.stat(fpath)
+    return f"{Path(fpath).resolve()}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def fingerprint_key(fpath):
+    return hashlib.sha1(fingerprint(fpath).encode()).hexdigest()
+
+
+class DecodedCache:
+    '''
+    LRU cache of decoded arrays by file fingerprint, thread safe,
+    arrays are returned read only - shared by all images opened from them
+    max_bytes: RAM limit, disk_dir: raw array files, None - RAM only
+    '''
+
+    def __init__(self, max_bytes=2 ** 30, disk_dir=None, disk_max_bytes=8 * 2 ** 30):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()  # key: (array, info), most recent last
+        self.keys = {}  # path: key of its current version
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return (f"DecodedCache({len(self.entries)} images, {self.nbytes / 2**20:.0f} MB, "
+                f"hits {self.hits}, misses {self.misses})")
+
+    def get(self, fpath, decode, convert=None):
+        ''' (array, info) of file,
+        decode(fpath) -> (raw array, info) on miss, raw array is kept on disk,
+        convert(raw array) -> array kept in RAM (eg. float conversion),
+        info: dict of numbers stored with array (eg. bitdepth) '''
+        key = fingerprint_key(fpath)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        raw, info = self._disk_get(key) or (None, None)
+        if raw is None:
+            raw, info = decode(fpath)
+            self._disk_put(key, raw, info)
+        arr = convert(raw) if convert else raw
+        arr.flags.writeable = False
+        self.put(key, (arr, info), Path(fpath).resolve())
+        return arr, info
+
+    def put(self, key, entry, path=None):
+        size = entry[0].nbytes
+        with self.lock:
+            old = self.keys.pop(path, None)
+            if old and old != key and old in self.entries:  # file was changed
+                self.nbytes -= self.entries.pop(old)[0].nbytes
+            if size > self.max_bytes:
+                return
+            self.keys[path] = key
+            if key in self.entries:  # put by other thread
+                return
+            self.entries[key] = entry
+            self.nbytes += size
+            self.trim(self.max_bytes)
+
+    def trim(self, max_bytes):
+        ''' drop least recently used entries over max_bytes, call with lock held '''
+        while self.nbytes > max_bytes and self.entries:
+            _, (arr, _) = self.entries.popitem(last=False)
+            self.nbytes -= arr.nbytes
+
+    def arrays(self):
+        with self.lock:
+            return [arr for arr, _ in self.entries.values()]
+
+    def evict(self, nbytes):
+        ''' free least recently used entries, returns freed bytes '''
+        with self.lock:
+            before = self.nbytes
+            self.trim(max(0, self.nbytes - nbytes))
+            return before - self.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys.clear()
+            self.nbytes = 0
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        fpath = self.disk_dir / f"{key}.npy"
+        if not fpath.is_file():
+            return None
+        try:
+            arr = np.load(fpath, mmap_mode='r')
+            info = dict(np.load(self.disk_dir / f"{key}.npz", allow_pickle=False))
+            os.utime(fpath)  # recently used, pruned last
+        except (OSError, ValueError) as e:
+            logging.info(f"decoded cache entry unreadable {fpath}: {e}")
+            return None
+        return arr, {k: v.item() for k, v in info.items()}
+
+    def _disk_put(self, key, arr, info):
+        if not self.disk_dir:
+            return
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            np.savez(self.disk_dir / f"{key}.npz", **info)
+            tmp = self.disk_dir / f"{key}.tmp.npy"
+            np.save(tmp, arr)
+            tmp.replace(self.disk_dir / f"{key}.npy")  # complete files only
+        except OSError as e:
+            logging.info(f"decoded cache not written: {e}")
+            return
+        self._disk_prune()
+
+    def _disk_prune(self):
+        ''' remove least recently used files over disk_max_bytes '''
+        files = sorted(self.disk_dir.glob("*.npy"), key=lambda f: f.stat().st_mtime)
+        total = sum(f.stat().st_size for f in files)
+        for f in files:
+            if total <= self.disk_max_bytes:
+                break
+            total -= f.stat().st_size
+            f.unlink(missing_ok=True)
+            f.with_suffix(".npz").unlink(missing_ok=True)
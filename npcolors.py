@@ -1,142 +1,124 @@
-# -*- coding: utf-8 -*-
-import numpy as np
-
-''' functions copied from matplotlib.colors for debugging '''
-
-
-def rgb_to_hsv(arr):
-    """
-    Convert float rgb values (in the range [0, 1]), in a numpy array to hsv
-    values.
-
-    Parameters
-    ----------
-    arr : (..., 3) array-like
-       All values must be in the range [0, 1]
-
-    Returns
-    -------
-    hsv : (..., 3) ndarray
-       Colors converted to hsv values in range [0, 1]
-    """
-    arr = np.asarray(arr)
-
-    # check length of the last dimension, should be _some_ sort of rgb
-    if arr.shape[-1] != 3:
-        raise ValueError("Last dimension of input array must be 3; "
-                         "shape {} was found.".format(arr.shape))
-
-    in_shape = arr.shape
-    arr = np.array(
-        arr, copy=False,
-        dtype=np.promote_types(arr.dtype, np.float32),  # Don't work on ints.
-        ndmin=2,  # In case input was 1D.
-    )
-    out = np.zeros_like(arr)
-    arr_max = arr.max(-1)
-    ipos = arr_max > 0
-    delta = arr.ptp(-1)
-    s = np.zeros_like(delta)
-    s[ipos] = delta[ipos] / arr_max[ipos]
-    ipos = delta > 0
-    # red is max
-    idx = (arr[..., 0] == arr_max) & ipos
-    out[idx, 0] = (arr[idx, 1] - arr[idx, 2]) / delta[idx]
-    # green is max
-    idx = (arr[..., 1] == arr_max) & ipos
-    out[idx, 0] = 2. + (arr[idx, 2] - arr[idx, 0]) / delta[idx]
-    # blue is max
-    idx = (arr[..., 2] == arr_max) & ipos
-    out[idx, 0] = 4. + (arr[idx, 0] - arr[idx, 1]) / delta[idx]
-
-    out[..., 0] = (out[..., 0] / 6.0) % 1.0
-    out[..., 1] = s
-    out[..., 2] = arr_max
-    out = out.reshape(in_shape)
-    return out
-
-
-
-def hsv_to_rgb(hsv):
-    """
-    Convert hsv values to rgb.
-
-    Parameters
-    ----------
-    hsv : (..., 3) array-like
-       All values assumed to be in range [0, 1]
-
-    Returns
-    -------
-    rgb : (..., 3) ndarray
-       Colors converted to RGB values in range [0, 1]
-    """
-    hsv = np.asarray(hsv)
-
-    # check length of the last dimension, should be _some_ sort of rgb
-    if hsv.shape[-1] != 3:
-        raise ValueError("Last dimension of input array must be 3; "
-                         "shape {shp} was found.".format(shp=hsv.shape))
-
-    in_shape = hsv.shape
-    hsv = np.array(
-        hsv, copy=False,
-        dtype=np.promote_types(hsv.dtype, np.float32),  # Don't work on ints.
-        ndmin=2,  # In case input was 1D.
-    )
-
-    h = hsv[..., 0]
-    s = hsv[..., 1]
-    v = hsv[..., 2]
-
-    r = np.empty_like(h)
-    g = np.empty_like(h)
-    b = np.empty_like(h)
-
-    i = (h * 6.0).astype(int)
-    f = (h * 6.0) - i
-    p = v * (1.0 - s)
-    q = v * (1.0 - s * f)
-    t = v * (1.0 - s * (1.0 - f))
-
-    idx = i % 6 == 0
-    r[idx] = v[idx]
-    g[idx] = t[idx]
-    b[idx] = p[idx]
-
-    idx = i == 1
-    r[idx] = q[idx]
-    g[idx] = v[idx]
-    b[idx] = p[idx]
-
-    idx = i == 2
-    r[idx] = p[idx]
-    g[idx] = v[idx]
-    b[idx] = t[idx]
-
-    idx = i == 3
-    r[idx] = p[idx]
-    g[idx] = q[idx]
-    b[idx] = v[idx]
-
-    idx = i == 4
-    r[idx] = t[idx]
-    g[idx] = p[idx]
-    b[idx] = v[idx]
-
-    idx = i == 5
-    r[idx] = v[idx]
-    g[idx] = p[idx]
-    b[idx] = q[idx]
-
-    idx = s == 0
-    r[idx] = v[idx]
-    g[idx] = v[idx]
-    b[idx] = v[idx]
-
-    rgb = np.stack([r, g, b], axis=-1)
-
-    return rgb.reshape(in_shape)
-
-
-
+# -*- coding: utf-8 -*-
+import numpy as np
+
+''' rgb <-> hsv conversion, same results as matplotlib.colors,
+processed in chunks of rows into preallocated output,
+so temporaries stay small even for large images '''
+
+CHUNK_PIXELS = 2 ** 18  # pixels converted at once, bounds temporaries
+
+
+def _check_last_dim(arr):
+    # check length of the last dimension, should be _some_ sort of rgb
+    if arr.shape[-1] != 3:
+        raise ValueError("Last dimension of input array must be 3; "
+                         "shape {} was found.".format(arr.shape))
+
+
+def _convert(kernel, arr, out, dtype, chunk_pixels):
+    ''' run kernel on chunks of rows of arr, write to out '''
+    arr = np.asarray(arr)
+    _check_last_dim(arr)
+    dtype = np.dtype(dtype or np.promote_types(arr.dtype, np.float32))
+    if out is None:
+        out = np.empty(arr.shape, dtype=dtype)
+    elif out.shape != arr.shape:
+        raise ValueError(f"out shape {out.shape} differs from {arr.shape}")
+
+    src, dst = np.atleast_2d(arr), np.atleast_2d(out)  # in case input was 1D
+    row_pixels = int(np.prod(src.shape[1:-1]))
+    rows = max(1, chunk_pixels // max(row_pixels, 1))
+    for i in range(0, src.shape[0], rows):
+        chunk = src[i:i + rows].astype(dtype, copy=False)
+        if np.shares_memory(chunk, dst):  # in place conversion
+            chunk = chunk.copy()
+        kernel(chunk, dst[i:i + rows])
+    return out
+
+
+def _rgb_to_hsv_kernel(rgb, hsv):
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    np.maximum(r, g, out=v)
+    np.maximum(v, b, out=v)
+    delta = np.minimum(r, g)
+    np.minimum(delta, b, out=delta)
+    np.subtract(v, delta, out=delta)
+
+    s[...] = 0
+    np.divide(delta, v, out=s, where=v > 0)
+
+    # blue max wins over green max wins over red max (as in matplotlib)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hue = np.where(b == v, 4. + (r - g) / delta,
+                       np.where(g == v, 2. + (b - r) / delta,
+                                (g - b) / delta))
+    hue[delta <= 0] = 0
+    hue /= 6.
+    np.mod(hue, 1., out=h)
+
+
+def _hsv_to_rgb_kernel(hsv, rgb):
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    f = h * 6.
+    i = f.astype(np.intp)
+    f -= i
+    i %= 6
+    p = v * (1. - s)
+    q = v * (1. - s * f)
+    t = np.multiply(s, 1. - f, out=f)
+    np.subtract(1., t, out=t)
+    t *= v
+    # s == 0 gives p = q = t = v, no special case needed
+    np.choose(i, (v, q, p, p, t, v), out=rgb[..., 0])
+    np.choose(i, (t, v, v, q, p, p), out=rgb[..., 1])
+    np.choose(i, (p, p, t, v, v, q), out=rgb[..., 2])
+
+
+def rgb_to_hsv(arr, out=None, dtype=None, chunk_pixels=CHUNK_PIXELS):
+    """
+    Convert float rgb values (in the range [0, 1]), in a numpy array to hsv
+    values.
+
+    Parameters
+    ----------
+    arr : (..., 3) array-like
+       All values must be in the range [0, 1]
+    out : (..., 3) ndarray, optional
+       Preallocated output, may be arr itself (in place conversion)
+    dtype : dtype, optional
+       Computation dtype, eg. np.float32, default at least float32
+    chunk_pixels : int
+       Number of pixels converted at once
+
+    Returns
+    -------
+    hsv : (..., 3) ndarray
+       Colors converted to hsv values in range [0, 1]
+    """
+    return _convert(_rgb_to_hsv_kernel, arr, out, dtype, chunk_pixels)
+
+
+def hsv_to_rgb(hsv, out=None, dtype=None, chunk_pixels=CHUNK_PIXELS):
+    """
+    Convert hsv values to rgb.
+
+    Parameters
+    ----------
+    hsv : (..., 3) array-like
+       All values assumed to be in range [0, 1]
+    out : (..., 3) ndarray, optional
+       Preallocated output, may be hsv itself (in place conversion)
+    dtype : dtype, optional
+       Computation dtype, eg. np.float32, default at least float32
+    chunk_pixels : int
+       Number of pixels converted at once
+
+    Returns
+    -------
+    rgb : (..., 3) ndarray
+       Colors converted to RGB values in range [0, 1]
+    """
+    return _convert(_hsv_to_rgb_kernel, hsv, out, dtype, chunk_pixels)
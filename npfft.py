@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import numpy as np
+
+'''
+frequency domain tools working on half spectrum (real fft, unshifted)
+as kept by npImage.make_fft
+
+distances and cutoffs are in pixels of fft display (from its center)
+'''
+
+FFT_BLUR_SIGMA = 8  # gaussian blur by fft above this sigma (faster)
+
+
+def distances(shape, center=(0, 0)):
+    ''' distance of half spectrum points from frequency center (rows, cols),
+    shape is image shape (rows, cols) '''
+    h, w = shape[:2]
+    u = np.fft.fftfreq(h, 1 / h)[:, None] - center[0]
+    v = np.fft.rfftfreq(w, 1 / w)[None, :] - center[1]
+    return np.hypot(u, v)
+
+
+def lowpass(d, cutoff, shape='gaussian', order=2):
+    ''' transfer function of lowpass filter for distances d '''
+    if shape == 'gaussian':
+        return np.exp(-d ** 2 / (2 * cutoff ** 2))
+    if shape == 'butterworth':
+        return 1 / (1 + (d / cutoff) ** (2 * order))
+    raise ValueError(f"unsupported filter shape: {shape}")
+
+
+def highpass(d, cutoff, shape='gaussian', order=2):
+    return 1 - lowpass(d, cutoff, shape=shape, order=order)
+
+
+def bandpass(d, low, high, shape='gaussian', order=2):
+    ''' keep frequencies between low and high cutoff '''
+    return highpass(d, low, shape, order) * lowpass(d, high, shape, order)
+
+
+def notch(shape, centers, radius, order=2):
+    ''' gaussian notch reject at centers (rows, cols from fft display center)
+    and their symmetric counterparts - removes halftone / moire peaks '''
+    transfer = np.ones((shape[0], shape[1] // 2 + 1))
+    for u0, v0 in centers:
+        for center in ((u0, v0), (-u0, -v0)):
+            transfer *= highpass(distances(shape, center), radius,
+                                 shape='gaussian', order=order)
+    return transfer
+
+
+def apply_transfer(spectrum, transfer):
+    ''' multiply spectrum in place, transfer broadcast to channels '''
+    if spectrum.ndim > transfer.ndim:
+        transfer = transfer[..., None]
+    spectrum *= transfer.astype(spectrum.real.dtype, copy=False)
+    return spectrum
+
+
+def gaussian(y, sigma, workers=None):
+    ''' gaussian blur of image axes by fft, cost does not grow with sigma,
+    reflected border like scipy.ndimage.gaussian_filter '''
+    from scipy import fft
+    h, w = y.shape[:2]
+    pad = [min(int(3 * sigma) + 1, n - 1) for n in (h, w)]
+    shape = [fft.next_fast_len(n + 2 * p, real=True) for n, p in zip((h, w), pad)]
+    after = [s - n - p for s, n, p in zip(shape, (h, w), pad)]
+    widths = [(pad[0], after[0]), (pad[1], after[1])] + [(0, 0)] * (y.ndim - 2)
+    yp = np.pad(y, widths, mode='symmetric')
+
+    spectrum = fft.rfft2(yp, axes=(0, 1), workers=workers)
+    fu = np.fft.fftfreq(shape[0])[:, None]
+    fv = np.fft.rfftfreq(shape[1])[None, :]
+    transfer = np.exp(-2 * np.pi ** 2 * sigma ** 2 * (fu ** 2 + fv ** 2))
+    apply_transfer(spectrum, transfer)
+    yp = fft.irfft2(spectrum, s=shape, axes=(0, 1), workers=workers)
+    return yp[pad[0]:pad[0] + h, pad[1]:pad[1] + w].astype(y.dtype, copy=False)
@@ -4,6 +4,14 @@ from pathlib import Path
 from nputils import natural_sort_key
 import logging
 
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".tif", ".tiff", ".gif"]
+
+
+def folder_files(folder, extensions):
+    ''' image files in folder, natural sort order '''
+    fs = [str(f) for f in Path(folder).glob("*.*") if f.suffix.lower() in extensions]
+    return sorted(fs, key=natural_sort_key)
+
 
 class FileList:
     '''
@@ -24,14 +32,10 @@ class FileList:
 
     def _get_files(self):
 
-        Fs = self.current.parent.glob("*.*")
-        
-        fs = [str(f) for f in Fs if f.suffix.lower() in self.extensions]
-        
+        fs = folder_files(self.current.parent, self.extensions)
+
         if len(fs) <= 1:
             return
-        
-        fs = sorted(fs, key=natural_sort_key)
 
         self.first = fs[0]
         self.last = fs[-1]
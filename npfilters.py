@@ -1,5 +1,14 @@
 #!/usr/bin/env python3
+import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import npfft
+import npworker
+
+PYRAMID_SIGMA = 40  # gaussian on downsampled image above this sigma
+CHANNEL_THREADS = os.cpu_count() or 1  # channels filtered concurrently
 
 def clip_result(func):
     ''' decorator to ensure result in limits 0..1 '''
@@ -10,8 +19,79 @@ def clip_result(func):
     return wrapper
 
 
-def invert(y):
-    return 1 - y
+def per_channel(func, y, *args, **kwargs):
+    ''' apply 2D filter func(channel, *args, output=..., **kwargs)
+    to each channel of image, channels run in threads (scipy releases GIL) '''
+    if np.ndim(y) < 3:
+        return func(y, *args, **kwargs)
+    out = np.empty(y.shape, dtype=np.result_type(y.dtype, np.float32))
+    check = npworker.cancel_checker()
+
+    def run(c):
+        check()
+        func(y[..., c], *args, output=out[..., c], **kwargs)
+
+    channels = range(y.shape[2])
+    if CHANNEL_THREADS > 1:
+        with ThreadPoolExecutor(max_workers=min(CHANNEL_THREADS, len(channels))) as pool:
+            list(pool.map(run, channels))
+    else:
+        for c in channels:
+            run(c)
+    return out
+
+
+def _init_out(y, out):
+    ''' output array initialised with y, new if out is None '''
+    if out is None:
+        return np.array(y, dtype=np.result_type(y, np.float32))
+    if out is not y:
+        out[...] = y
+    return out
+
+
+def _to_out(result, out):
+    ''' copy result of filter without out support to out '''
+    if out is None:
+        return result
+    out[...] = result
+    return out
+
+
+def apply_to_value(func, y, *args, out=None, value=None, **kwargs):
+    ''' apply tone filter to value (max of r, g, b) of rgb array,
+    rgb is scaled by v'/v - same result as rgb -> hsv -> rgb roundtrip,
+    hue and saturation are kept without computing them,
+    value: precomputed value of y (npImage cache), computed when None '''
+    if np.ndim(y) < 3:
+        if out is not None:
+            kwargs["out"] = out
+        return func(y, *args, **kwargs)
+    v = y.max(axis=-1) if value is None else value
+    v_new = func(v, *args, **kwargs)
+    v_new = np.broadcast_to(np.asarray(v_new, dtype=v.dtype), v.shape)
+    ratio = np.divide(v_new, v, out=np.zeros_like(v), where=v > 0)
+    out = np.multiply(y, ratio[..., None], out=out)
+    black = v <= 0  # no hue - becomes gray
+    out[black] = v_new[black][..., None]
+    return out
+
+
+def tone(func):
+    ''' decorator for tone filters:
+    value_only=True - apply to value of rgb, keep hue and saturation
+    filters accept out= array for result, may be y itself (in place) '''
+    @wraps(func)
+    def wrapper(y, *args, value_only=False, value=None, **kwargs):
+        if value_only:
+            return apply_to_value(func, y, *args, value=value, **kwargs)
+        return func(y, *args, **kwargs)
+    return wrapper
+
+
+@tone
+def invert(y, out=None):
+    return np.subtract(1, y, out=out)
 
 
 def mirror(y):
@@ -22,99 +102,217 @@ def flip(y):
     return np.flip(y, 0)
 
 
-def normalize(y):
+@tone
+def normalize(y, out=None):
     ''' Normalize array --> values 0...1 '''
-    return (y - y.min()) / y.ptp()
+    lo, ptp = np.min(y), np.ptp(y)
+    out = np.subtract(y, lo, out=out)
+    out /= ptp
+    return out
 
 
-def equalize(y):
+@tone
+def equalize(y, out=None):
     from skimage import exposure
-    return exposure.equalize_hist(y)
+    return _to_out(exposure.equalize_hist(y), out)
 
 
-def adaptive_equalize(y, clip_limit=0.03):
+@tone
+def adaptive_equalize(y, clip_limit=0.03, out=None):
     from skimage import exposure
-    return exposure.equalize_adapthist(y, clip_limit=clip_limit)
+    return _to_out(exposure.equalize_adapthist(y, clip_limit=clip_limit), out)
 
 
-def gamma(y, g):
+@tone
+def gamma(y, g, out=None):
     """gamma correction of an numpy float image, where
     g = 1 ~ no effect, g > 1 ~ darken, g < 1 ~ brighten
     """
-    return y ** g
+    return np.power(y, g, out=out)
+
+
+def gaussian(y, sigma, method='auto', out=None):
+    ''' gaussian blur
+    method:
+        'exact' - scipy gaussian_filter, cost grows with sigma
+        'fft' - convolution by fft, cost independent of sigma
+        'box' - cascade of 3 box filters, approximation, constant cost
+        'pyramid' - downsample, blur, upsample, approximation for huge sigma
+        'auto' - exact for small sigma, fft, pyramid for huge sigma
+    '''
+    if method == 'auto':
+        if sigma < npfft.FFT_BLUR_SIGMA:
+            method = 'exact'
+        elif sigma < PYRAMID_SIGMA:
+            method = 'fft'
+        else:
+            method = 'pyramid'
+
+    if method == 'exact':  # do not blur across color channels
+        from scipy.ndimage import gaussian_filter
+        return _to_out(per_channel(gaussian_filter, y, sigma), out)
+    if method == 'fft':
+        return _to_out(npfft.gaussian(y, sigma, workers=CHANNEL_THREADS), out)
+    if method == 'box':
+        return _to_out(box_gaussian(y, sigma), out)
+    if method == 'pyramid':
+        return _to_out(pyramid_gaussian(y, sigma), out)
+    raise ValueError(f"unsupported gaussian method: {method}")
+
+
+def _box_sizes(sigma, n=3):
+    ''' widths of n box filters approximating gaussian of sigma '''
+    wl = int(np.sqrt(12 * sigma ** 2 / n + 1))
+    wl -= 1 - wl % 2  # odd width
+    wu = wl + 2
+    m = round((12 * sigma ** 2 - n * wl ** 2 - 4 * n * wl - 3 * n) / (-4 * wl - 4))
+    return [wl if i < m else wu for i in range(n)]
+
+
+def box_gaussian(y, sigma, n=3):
+    ''' gaussian approximated by n box filters on image axes,
+    running sums - cost per pixel does not depend on sigma '''
+    return per_channel(_box_gaussian, y, sigma, n)
+
+
+def _box_gaussian(y, sigma, n=3, output=None):
+    from scipy.ndimage import uniform_filter1d
+    for axis in (0, 1):
+        for size in _box_sizes(sigma, n):
+            y = uniform_filter1d(y, size, axis=axis, mode='reflect')
+    if output is None:
+        return y
+    output[...] = y
+    return output
+
+
+def pyramid_gaussian(y, sigma):
+    ''' gaussian of huge sigma: blur image downsampled by block mean,
+    upsample back by linear interpolation '''
+    k = max(1, int(sigma // (PYRAMID_SIGMA / 4)))
+    small = _block_mean(y, k)
+    # block mean is box filter of width k, its variance is already applied
+    small_sigma = max(sigma ** 2 - (k ** 2 - 1) / 12, 0) ** .5 / k
+    small = gaussian(small, small_sigma)
+    return _upsample_linear(small, k, y.shape[:2]).astype(y.dtype, copy=False)
+
+
+def _block_mean(y, k):
+    ''' downsample image axes k times by mean of k x k blocks '''
+    h, w = y.shape[:2]
+    pad = [(0, -h % k), (0, -w % k)] + [(0, 0)] * (y.ndim - 2)
+    y = np.pad(y, pad, mode='edge')
+    rows, cols = y.shape[0] // k, y.shape[1] // k
+    return y.reshape(rows, k, cols, k, *y.shape[2:]).mean(axis=(1, 3))
+
+
+def _upsample_linear(y, k, shape):
+    ''' upsample image axes k times to shape, separable linear interpolation,
+    block centers as in _block_mean '''
+    for axis, n in enumerate(shape):
+        x = np.clip((np.arange(n) + .5) / k - .5, 0, y.shape[axis] - 1)
+        i0 = np.floor(x).astype(np.intp)
+        i1 = np.minimum(i0 + 1, y.shape[axis] - 1)
+        weight = (x - i0).reshape((-1,) + (1,) * (y.ndim - axis - 1))
+        y0 = np.take(y, i0, axis=axis)
+        y1 = np.take(y, i1, axis=axis)
+        y = y0 + weight * (y1 - y0)
+    return y
 
 
-def unsharp_mask(y, radius, amount):
-    from scipy.ndimage import gaussian_filter
-    mask = gaussian_filter(y, radius)
-    y = y + amount * (y - mask)
-    return y
+def unsharp_mask(y, radius, amount, method='auto', out=None):
+    mask = gaussian(y, radius, method=method)
+    np.subtract(y, mask, out=mask)
+    mask *= amount
+    return np.add(y, mask, out=out)
 
 
-def blur(y, radius=3):
-    from scipy.ndimage import gaussian_filter
-    return gaussian_filter(y, radius)
+def blur(y, radius=3, method='auto', out=None):
+    return gaussian(y, radius, method=method, out=out)
 
 
-def contrast(y, f):
+@tone
+def contrast(y, f, out=None):
     """ change contrast """
-    return .5 + f * (y - .5)
+    out = np.subtract(y, .5, out=out)
+    out *= f
+    out += .5
+    return out
 
 
-def multiply(y, f):
+@tone
+def multiply(y, f, out=None):
     """ multiply by scalar """
-    return y * f
+    return np.multiply(y, f, out=out)
 
 
-def fill(y, f=0):
+def fill(y, f=0, out=None):
     """ change to constant """
-    return f
+    if out is None:
+        return f
+    out[...] = f
+    return out
 
 
-def add(y, f):
+@tone
+def add(y, f, out=None):
     """ change brightness """
-    return y + f
+    return np.add(y, f, out=out)
 
 
-def tres_high(y, f):
+@tone
+def tres_high(y, f, out=None):
     """  change value of light pixels to 1 """
-    y[y > f] = 1
-    return y
+    mask = y > f
+    out = _init_out(y, out)
+    out[mask] = 1
+    return out
 
 
-def tres_low(y, f):
+@tone
+def tres_low(y, f, out=None):
     """ change value of dark pixels to 0 """
-    y[y < f] = 0
-    return y
+    mask = y < f
+    out = _init_out(y, out)
+    out[mask] = 0
+    return out
 
 
-def clip_high(y, f):
+@tone
+def clip_high(y, f, out=None):
     """ change value of light pixels to limit """
-    y[y > f] = f
-    return y
+    return np.minimum(y, f, out=out)
 
 
-def clip_low(y, f):
+@tone
+def clip_low(y, f, out=None):
     """ change value of dark pixels to limit """
-    y[y < f] = f
-    return y
+    return np.maximum(y, f, out=out)
 
 
-def sigmoid(y, gain=1, center=0.5):
+@tone
+def sigmoid(y, gain=1, center=0.5, out=None):
     """ s shaped curve - increase contrast """
-    y = (1 + np.exp(-gain * (y - center)))**(-1)
+    out = np.subtract(y, center, out=out)
+    out *= -gain
+    np.exp(out, out=out)
+    out += 1
+    np.reciprocal(out, out=out)
     #y = np.tanh((y - .5) * sigma) / 2 + .5
-    return y
+    return out
 
 
-def logit(y, gain=1, center=0.5):
+@tone
+def logit(y, gain=1, center=0.5, out=None):
     """ n shaped curve - decrease contrast"""
-    y = - np.log((y - center)**(-1) - 1) / gain
-    return y
+    out = np.subtract(y, center, out=out)
+    np.reciprocal(out, out=out)
+    out -= 1
+    np.log(out, out=out)
+    out /= -gain
+    return out
 
 
-def high_pass(y, sigma):
-    from scipy.ndimage import gaussian_filter
-    bg = gaussian_filter(y, sigma=sigma)
-    y = y - bg
-    return y
+def high_pass(y, sigma, method='auto', out=None):
+    bg = gaussian(y, sigma, method=method)
+    return np.subtract(y, bg, out=out)
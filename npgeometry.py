@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import npworker
+
+'''
+geometric transforms of image arrays (rows, cols[, channels])
+'''
+
+TILE_THREADS = os.cpu_count() or 1  # output tiles computed concurrently
+TILE_PIXELS = 2 ** 20  # resize: input pixels of intermediate tile
+LANCZOS_LOBES = 3
+
+
+def _run(tasks, threads):
+    ''' run callables, in threads if allowed,
+    worker job cancelled - remaining tasks are skipped '''
+    check = npworker.cancel_checker()
+
+    def run(task):
+        check()
+        task()
+
+    if threads > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run, tasks))
+    else:
+        for task in tasks:
+            run(task)
+
+
+def rotate(arr, angle, order=1, mode='nearest', reshape=True,
+           dtype=np.float32, threads=TILE_THREADS):
+    ''' rotate image counter-clockwise by angle in degrees,
+    same geometry as scipy.ndimage.rotate, computed in dtype,
+    output split into bands of rows processed in threads
+    order: spline interpolation, 0 nearest, 1 linear, 3 cubic (slow) '''
+    from scipy import ndimage
+
+    arr = np.asarray(arr).astype(dtype, copy=False)
+    h, w = arr.shape[:2]
+    a = np.deg2rad(angle)
+    c, s = np.cos(a), np.sin(a)
+    matrix = np.array([[c, s], [-s, c]])
+
+    in_shape = np.array([h, w])
+    if reshape:
+        bounds = matrix @ [[0, 0, h, h], [0, w, 0, w]]
+        out_shape = (np.ptp(bounds, axis=1) + .5).astype(int)
+    else:
+        out_shape = in_shape
+    offset = (in_shape - 1) / 2 - matrix @ ((out_shape - 1) / 2)
+
+    channels = [arr] if arr.ndim == 2 else [arr[..., i] for i in range(arr.shape[2])]
+    out = np.empty((*out_shape, *arr.shape[2:]), dtype=dtype)
+    outs = [out] if arr.ndim == 2 else [out[..., i] for i in range(arr.shape[2])]
+
+    npad = 0
+    if order > 1:  # spline coefficients once for whole channel, not per tile
+        if mode == 'nearest':  # as scipy, nearest has no exact spline boundary
+            npad = 12
+            channels = [np.pad(ch, npad, mode='edge') for ch in channels]
+        channels = [ndimage.spline_filter(ch, order=order, output=dtype, mode=mode)
+                    for ch in channels]
+        offset = offset + npad
+
+    rows = -(-out_shape[0] // max(1, threads))
+    tasks = []
+    for ch, o in zip(channels, outs):
+        for r0 in range(0, out_shape[0], rows):
+            band = o[r0:r0 + rows]
+            tasks.append(lambda ch=ch, band=band, r0=r0: ndimage.affine_transform(
+                ch, matrix, offset + matrix[:, 0] * r0, output_shape=band.shape,
+                output=band, order=order, mode=mode, prefilter=False))
+    _run(tasks, threads)
+
+    if order > 1:  # spline overshoot
+        np.clip(out, 0, 1, out=out)
+    return out
+
+
+def _lanczos(x):
+    return np.where(np.abs(x) < LANCZOS_LOBES,
+                    np.sinc(x) * np.sinc(x / LANCZOS_LOBES), 0)
+
+
+def _triangle(x):
+    return np.maximum(1 - np.abs(x), 0)
+
+
+RESIZE_KERNELS = {"bilinear": (_triangle, 1),  # kernel, support (pixels)
+                  "lanczos": (_lanczos, LANCZOS_LOBES),
+                  }
+
+
+def resize_weights(n_in, n_out, method='area'):
+    """ separable resampling of one axis: input indices and weights (n_out, taps),
+    area - mean of covered input pixels (exact overlap), same as PIL BOX
+           at integer factors, at fractional scales PIL takes whole pixels
+           by their centers, area weights the partly covered ones,
+    bilinear, lanczos - kernel widened by scale when downscaling (antialias) """
+    scale = n_in / n_out
+    if method == 'area':
+        x0 = np.arange(n_out) * scale
+        first = np.floor(x0).astype(int)
+        idx = first[:, None] + np.arange(int(np.ceil(scale)) + 1)
+        weights = (np.minimum(idx + 1, x0[:, None] + scale)
+                   - np.maximum(idx, x0[:, None])).clip(0)
+    else:
+        try:
+            kernel, support = RESIZE_KERNELS[method]
+        except KeyError:
+            raise ValueError(f"unsupported resize method: {method}")
+        fscale = max(scale, 1)
+        support *= fscale
+        centers = (np.arange(n_out) + .5) * scale
+        first = np.floor(centers - support).astype(int)
+        idx = first[:, None] + np.arange(int(np.ceil(2 * support)) + 1)
+        weights = kernel((idx + .5 - centers[:, None]) / fscale)
+    weights[(idx < 0) | (idx >= n_in)] = 0  # outside image, renormalized
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(idx, 0, n_in - 1), weights
+
+
+def _resize_matrix(n_in, n_out, method, dtype):
+    """ sparse (n_out, n_in) matrix of axis resampling weights """
+    from scipy import sparse
+    idx, weights = resize_weights(n_in, n_out, method)
+    rows = np.repeat(np.arange(n_out), idx.shape[1])
+    mat = sparse.csr_matrix((weights.ravel().astype(dtype), (rows, idx.ravel())),
+                            shape=(n_out, n_in))
+    mat.eliminate_zeros()  # taps outside covered pixels
+    return mat
+
+
+def resize(arr, shape, method='auto', dtype=np.float32, threads=TILE_THREADS):
+    """ resize image to shape (rows, cols), result in dtype
+    method: 'area' (downscale), 'bilinear', 'lanczos',
+            'auto' - area when downscaling, lanczos when enlarging
+    separable: sparse weight matrix of rows, then of columns,
+    output split into bands of rows, processed in threads """
+    arr = np.ascontiguousarray(arr)  # transformed views copied once
+    h, w = arr.shape[:2]
+    oh, ow = (max(1, int(round(n))) for n in shape[:2])
+    if method == 'auto':
+        method = 'area' if oh * ow <= h * w else 'lanczos'
+    rmat = _resize_matrix(h, oh, method, dtype)
+    cmat = _resize_matrix(w, ow, method, dtype)
+    flat = arr.reshape(h, -1)
+
+    out = np.empty((oh, ow, *arr.shape[2:]), dtype=dtype)
+    rows = max(1, min(-(-oh // max(1, threads)), TILE_PIXELS // w))
+
+    def band(r0):
+        o = out[r0:r0 + rows]
+        tmp = rmat[r0:r0 + rows] @ flat  # (band rows, cols * channels)
+        tmp = tmp.reshape(len(o), w, -1).swapaxes(0, 1).reshape(w, -1)
+        o[...] = (cmat @ tmp).reshape(ow, len(o), -1).swapaxes(0, 1).reshape(o.shape)
+
+    _run([lambda r0=r0: band(r0) for r0 in range(0, oh, rows)], threads)
+
+    if method == 'lanczos':  # negative lobes overshoot
+        np.clip(out, 0, 1, out=out)
+    return out
+
+
+class Transform:
+    '''
+    lazy geometry of image: crop of base array, then transpose and flips,
+    90 degree rotations, flips and crops are composed without touching pixels,
+    apply() returns numpy view of base array (no copy)
+    crop: (row0, row1, col0, col1) in base array, None - whole array
+    '''
+
+    def __init__(self, crop=None, transpose=False, flip_rows=False, flip_cols=False):
+        self.crop_box = crop
+        self.transpose = transpose
+        self.flip_rows = flip_rows
+        self.flip_cols = flip_cols
+
+    def __repr__(self):
+        return (f"Transform(crop={self.crop_box}, transpose={self.transpose}, "
+                f"flip_rows={self.flip_rows}, flip_cols={self.flip_cols})")
+
+    @property
+    def identity(self):
+        return not (self.crop_box or self.transpose
+                    or self.flip_rows or self.flip_cols)
+
+    def apply(self, base):
+        ''' view of base array as transformed image '''
+        if base is None:
+            return None
+        v = base
+        if self.crop_box:
+            r0, r1, c0, c1 = self.crop_box
+            v = v[r0:r1, c0:c1]
+        if self.transpose:
+            v = v.swapaxes(0, 1)
+        if self.flip_rows:
+            v = v[::-1]
+        if self.flip_cols:
+            v = v[:, ::-1]
+        return v
+
+    def shape(self, base_shape):
+        ''' shape of transformed image (rows, cols) '''
+        if self.crop_box:
+            r0, r1, c0, c1 = self.crop_box
+            base_shape = (r1 - r0, c1 - c0)
+        h, w = base_shape[:2]
+        return (w, h) if self.transpose else (h, w)
+
+    def rotate(self, k=1):
+        ''' rotate clockwise by k * 90 degrees, as np.rot90(a, -k) '''
+        t = self
+        for _ in range(k % 4):  # rot90(a, -1) == a.T[:, ::-1]
+            t = Transform(t.crop_box, not t.transpose,
+                          flip_rows=t.flip_cols, flip_cols=not t.flip_rows)
+        return t
+
+    def flip(self):
+        ''' upside down, as np.flip(a, 0) '''
+        return Transform(self.crop_box, self.transpose,
+                         not self.flip_rows, self.flip_cols)
+
+    def mirror(self):
+        ''' left - right, as np.flip(a, 1) '''
+        return Transform(self.crop_box, self.transpose,
+                         self.flip_rows, not self.flip_cols)
+
+    def crop(self, rows, cols, base_shape):
+        ''' crop transformed image by slices of its rows and cols '''
+        h, w = self.shape(base_shape)
+        r0, r1, _ = rows.indices(h)
+        c0, c1, _ = cols.indices(w)
+        r1, c1 = max(r0, r1), max(c0, c1)
+        if self.flip_rows:
+            r0, r1 = h - r1, h - r0
+        if self.flip_cols:
+            c0, c1 = w - c1, w - c0
+        if self.transpose:
+            r0, r1, c0, c1 = c0, c1, r0, r1
+        if self.crop_box:
+            R0, _, C0, _ = self.crop_box
+            r0, r1, c0, c1 = r0 + R0, r1 + R0, c0 + C0, c1 + C0
+        return Transform((r0, r1, c0, c1), self.transpose,
+                         self.flip_rows, self.flip_cols)
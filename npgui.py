@@ -42,6 +42,13 @@ def askfloat(prompt, **kw):
     return float(d.result)
 
 
+def askfloat_preview(prompt, preview, from_=None, to=None, **kw):
+    ''' ask float with slider, preview(value) is called on every change '''
+    d = PreviewBox(prompt, preview, title="AskFloat", from_=from_, to=to, **kw)
+    if d.result is None:
+        raise dialogException("Exception: input empty")
+    return float(d.result)
+
 
 class InputBox:
     def __init__(self, prompt='', title='Inputbox', parent=None, initialvalue=''):
@@ -66,12 +73,16 @@ class InputBox:
         self.win.bind('<KP_Enter>', lambda event: self.ok())   
         self.win.bind('<Return>', lambda event: self.ok()) 
         self.win.bind("<Escape>", lambda event: self.cancel())
+        self._add_widgets()
         print("enter mainloop")
         # self.grab_set()
         self.win.mainloop()
         self.win.destroy()
         
                                                  
+    def _add_widgets(self):
+        ''' extra widgets for subclasses '''
+
     def ok(self):
         self.result = self.win.e1.get()
         print("ok")
@@ -89,6 +100,56 @@ class InputBox:
 
 
 
+class PreviewBox(InputBox):
+    ''' InputBox with slider, calls preview(value) when value changes,
+    changes are coalesced - preview runs once tk is idle '''
+
+    def __init__(self, prompt, preview, title='Preview', parent=None,
+                 initialvalue=1., from_=None, to=None):
+        self.preview = preview
+        self._pending = None
+        initialvalue = float(initialvalue)
+        from_ = 0. if from_ is None else from_
+        to = (2 * initialvalue or 1.) if to is None else to
+        self.scale_range = (from_, to)
+        super().__init__(prompt, title=title, parent=parent,
+                         initialvalue=initialvalue)
+
+    def _add_widgets(self):
+        from_, to = self.scale_range
+        self.win.var = tk.DoubleVar(value=float(self.win.e1.get()))
+        self.win.scale = tk.Scale(self.win, variable=self.win.var,
+                                  from_=from_, to=to,
+                                  resolution=(to - from_) / 200 or .01,
+                                  orient=tk.HORIZONTAL, length=300,
+                                  command=lambda v: self._changed(v))
+        self.win.scale.grid(row=1, columnspan=2)
+        self.win.e1.bind('<KeyRelease>',
+                         lambda event: self._changed(self.win.e1.get()))
+        self._changed(self.win.e1.get())
+
+    def _changed(self, value):
+        if self.win.e1.get() != value:
+            self.win.e1.delete(0, tk.END)
+            self.win.e1.insert(0, value)
+        if self._pending is None:
+            self._pending = self.win.after_idle(self._preview)
+
+    def _preview(self):
+        self._pending = None
+        try:
+            value = float(self.win.e1.get())
+        except ValueError:
+            return
+        self.preview(value)
+
+    def _quit(self):
+        if self._pending is not None:
+            self.win.after_cancel(self._pending)
+            self._pending = None
+        super()._quit()
+
+
 if __name__ == "__main__":
  
     root = tk.Tk()
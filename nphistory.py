@@ -1,7 +1,24 @@
 #!/usr/bin/env python3
 from collections import deque
+import itertools
 import logging
+import tempfile
 
+import numpy as np
+
+
+def _pixels(state):
+    ''' array of state (npImage.snapshot or plain array) '''
+    return state["base"] if isinstance(state, dict) else state
+
+
+def _with_pixels(state, arr, new):
+    ''' state with array arr replaced by new '''
+    if state is arr:
+        return new
+    if isinstance(state, dict) and state["base"] is arr:
+        return {**state, "base": new}
+    return state
 
 
 class History():
@@ -15,6 +32,8 @@ class History():
         self.redo_queue = deque([], max_length)
         self.original = None  # keep original image as loaded
         self.toggle_original = False  # toggle state
+        self._spill_dir = None  # temporary dir of states moved to disk
+        self._spill_names = itertools.count()
 #        self.log = []
 
     def __repr__(self):
@@ -23,14 +42,17 @@ class History():
         return "undo: " + str(undo) + " redo: " +  str(redo)
 
 
-    def add(self, arr, func_name):
-        ''' add array to history, discard redo '''
+    def add(self, state, func_name):
+        ''' add image state (npImage.snapshot) to history, discard redo,
+        plain arrays are copied '''
         if self.max_length == 0:
             logging.debug("history disabled")
             return
 
+        if hasattr(state, "copy"):
+            state = state.copy()  # pixels of array, only references of snapshot
         self.undo_queue.append({'func_name' : func_name,
-                                'arr' : arr.copy(),
+                                'state' : state,
                                 })
         self.redo_queue.clear()  # discard redo queue
         logging.debug(f"added to history: {func_name}, len:{len(self.undo_queue)}")
@@ -38,6 +60,44 @@ class History():
 #        self.log.append(func_name)  # save caller function name to history
 #        logging.debug(f"modification log: {self.log}")
 
+    def arrays(self):
+        ''' pixels kept by history (memory accounting) '''
+        for item in (*self.undo_queue, *self.redo_queue):
+            yield _pixels(item["state"])
+            if isinstance(item["state"], dict):
+                yield item["state"].get("fft")  # spectrum in fft mode
+        if self.original is not None:
+            yield _pixels(self.original)
+
+    def spill(self, nbytes, keep=()):
+        ''' move pixels of oldest states to disk (memory mapped, read only),
+        current state stays in RAM, keep: arrays used elsewhere (spilling
+        them frees nothing), returns freed bytes '''
+        keep = {id(a) for a in keep}
+        if self.undo_queue:
+            keep.add(id(_pixels(self.undo_queue[-1]["state"])))
+        freed = 0
+        for item in (*self.undo_queue, *self.redo_queue):
+            if freed >= nbytes:
+                break
+            arr = _pixels(item["state"])
+            if arr is None or id(arr) in keep or isinstance(arr, np.memmap):
+                continue
+            mapped = self._to_disk(arr)
+            for other in (*self.undo_queue, *self.redo_queue):  # shared by states
+                other["state"] = _with_pixels(other["state"], arr, mapped)
+            self.original = _with_pixels(self.original, arr, mapped)
+            freed += arr.nbytes
+        logging.info(f"history spilled {freed / 2**20:.0f} MB to disk")
+        return freed
+
+    def _to_disk(self, arr):
+        if self._spill_dir is None:  # removed with history
+            self._spill_dir = tempfile.TemporaryDirectory(prefix="npyshop_history_")
+        fpath = f"{self._spill_dir.name}/{next(self._spill_names)}.npy"
+        np.save(fpath, arr)
+        return np.load(fpath, mmap_mode='r')
+
     def undo(self):
         ''' get last array from history and move it to redo '''
 
@@ -54,6 +114,11 @@ class History():
 
         return previous
 
+    def current(self):
+        ''' get current state (last added), even if it is the only one '''
+        if self.undo_queue:
+            return self.undo_queue[-1]
+
     def last(self):
         ''' get last array from history and leave it there '''
         if len(self.undo_queue) > 1:
@@ -1,13 +1,9 @@
 #!/usr/bin/env python3
 import tkinter as tk
 
-
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
 from skimage_exposure import cumulative_distribution  # histogram plotting
 
-from testing.timeit import timeit
+from npprofile import timed
 
 
 """
@@ -17,7 +13,7 @@ HISTOGRAM WINDOW
 
 class histWin(tk.Toplevel):
 
-    @timeit
+    @timed
     def __init__(self, master=None, hide=True, bins=256, linewidth=1.0):
         super().__init__(master)
         self.title("Histogram")
@@ -28,16 +24,22 @@ class histWin(tk.Toplevel):
         self.linewidth = linewidth
         self.bins = bins
         self.hidden = hide
-        plt.rcParams.update({'font.size': 5})
         self.draw()
         if self.hidden:
             self.withdraw()
         self.master.focus_force() 
 
-    @timeit
+    @timed
     def draw(self):
-
-        self.fig, self.ax_hist = plt.subplots()
+        # matplotlib imported with first histogram window (startup time),
+        # figure without pyplot - embedded in tk window
+        import matplotlib
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        matplotlib.rcParams.update({'font.size': 5})
+        self.fig = Figure()
+        self.ax_hist = self.fig.subplots()
 #        self.ax_hist.set_xticks(np.linspace(0, 1, 11))
         self.ax_hist.set_xlim(0, 1)
         self.ax_hist.set_ylim(0, 10)
@@ -73,7 +75,7 @@ class histWin(tk.Toplevel):
         self.update
 
 
-    @timeit
+    @timed
     def update(self):
 
         if self.hidden:
@@ -4,26 +4,42 @@ import numpy as np
 import logging
 from pathlib import Path
 from send2trash import send2trash
-from tkinter import filedialog
-from matplotlib.colors import rgb_to_hsv, hsv_to_rgb
+from npcolors import rgb_to_hsv, hsv_to_rgb
 from skimage_dtype import img_as_float, img_as_ubyte, img_as_uint
 from imageio import imread, imwrite
+import npfft
+import npgeometry
+import npprofile
 
 FILETYPES = ['jpeg', 'bmp', 'png', 'tiff']
+FFT_TOLERANCE = 1e-3  # inverse fft out of 0..1 by more -> normalize
 
 
 class npImage():
 
+    decoded_cache = None  # npcache.DecodedCache shared by images, None - off
+
     def __init__(self, img_path=None, img_arr=None, fft=None):
+        self.version = 0  # incremented when pixels change
+        self._reprs = {}  # color model: (version, array), cached conversions
+        self._views = {}  # (zoom, method): (version, array), display pyramid
+        self._base = None  # pixels, arr is view of base through transform
+        self.transform = npgeometry.Transform()  # lazy rotate / flip / crop
+        self._shared = False  # base may be referenced by history or caches
         self.fpath = img_path
         self.arr = img_arr
         self.bitdepth = None
         self.original = None
         self.slice = np.s_[:, :, ...]
+        self.mask = None  # npmask.Mask of selection (box is slice), None - rectangle
         self.filetype = None
         self.filesize = 0
         self.color_model = 'gray'
-        self.fft = None
+        self.fft = None  # half spectrum (real fft), unshifted, complex64
+        self.fft_mode = 'channels'  # spectrum of each channel or 'luminance'
+        self.fft_workers = None  # threads for fft, -1 = all cores
+        self._fft_state = None  # shape, dtype, display version of fft
+        self._fft_cache = None  # spectrum of current image after ifft
 
         if img_path:
             self.load(img_path)
@@ -51,29 +67,154 @@ class npImage():
         return 1 if self.arr.ndim == 2 else self.arr.shape[2]
 
 
+    @property
+    def arr(self):
+        ''' image pixels - view of base array through transform '''
+        return self.transform.apply(self._base)
+
+    @arr.setter
+    def arr(self, arr):
+        ''' new pixels - cached conversions are not valid,
+        array may be referenced elsewhere, copied before edit in place '''
+        self._base = arr
+        self.transform = npgeometry.Transform()
+        self._shared = True
+        self.changed()
+
+    def changed(self):
+        ''' call after pixels were changed in place '''
+        self.version += 1
+        self._reprs = {}
+        self._views = {}
+
+    def materialize(self):
+        ''' pixels are going to be edited in place:
+        apply transform to own contiguous copy of base,
+        history snapshots keep the old base untouched '''
+        if self._base is None:
+            return
+        if self._shared or not self.transform.identity:
+            logging.debug(f"materialize {self.transform}")
+            self._base = np.array(self.arr)
+            npprofile.count("bytes", self._base.nbytes)
+            self.transform = npgeometry.Transform()
+            self._shared = False
+
+    def snapshot(self):
+        ''' image state for history, no pixels copied,
+        spectrum in fft mode is never edited in place, kept as is '''
+        self._shared = True
+        return {"base": self._base,
+                "transform": self.transform,
+                "color_model": self.color_model,
+                "fft": self.fft,
+                "fft_state": self._fft_state,
+                }
+
+    def restore(self, state):
+        ''' return to state from snapshot, no pixels copied '''
+        self._base = state["base"]
+        self.transform = state["transform"]
+        self.color_model = state["color_model"]
+        self.fft = state.get("fft")
+        self._fft_state = state.get("fft_state")
+        self._shared = True
+        self.changed()
+
+
+    def arrays(self):
+        ''' arrays kept alive by image (memory accounting), display views not included '''
+        yield self._base
+        yield from (a for _, a in self._reprs.values())
+        yield self.fft
+        if self._fft_cache:
+            yield self._fft_cache["spectrum"]
+            yield self._fft_cache["display"]
+
+    def view_arrays(self):
+        return [a for _, a in self._views.values()]
+
+    def drop_views(self, nbytes):
+        ''' free cached display levels, largest first, returns freed bytes '''
+        freed = 0
+        for key, (_, a) in sorted(self._views.items(), key=lambda kv: -kv[1][1].nbytes):
+            if freed >= nbytes:
+                break
+            del self._views[key]
+            freed += a.nbytes
+        logging.info(f"view levels dropped, {freed / 2**20:.0f} MB")
+        return freed
+
+    def representation(self, model):
+        ''' image in color model (rgb, hsv, gray),
+        computed lazily and cached until pixels change '''
+        if model == self.color_model and not (model == 'gray' and self.arr.ndim == 3):
+            return self.arr  # rgba loads as 'gray', its luminance is converted
+        cached = self._reprs.get(model)
+        if cached and cached[0] == self.version:
+            return cached[1]
+        arr = self._convert(model)
+        self._reprs[model] = (self.version, arr)
+        return arr
+
+    def hsv(self):
+        return self.representation('hsv')
+
+    def hsv_cached(self):
+        if self.color_model == 'hsv':
+            return True
+        cached = self._reprs.get('hsv')
+        return bool(cached) and cached[0] == self.version
+
+    def luminance(self):
+        return self.representation('gray')
+
+    def value(self):
+        ''' value channel (max of r, g, b), taken from cached hsv when valid '''
+        return self.representation('value')
+
+    def _convert(self, model):
+        ''' convert arr from current color model '''
+        if model == 'gray':  # luminance, always 2-D (alpha dropped)
+            return gray(self.representation('rgb') if self.color_model == 'hsv' else self.arr)
+        if model == 'value':
+            if self.color_model == 'gray':
+                return self.arr[..., :3].max(axis=-1) if self.arr.ndim == 3 else self.arr
+            hsv = self.representation('hsv') if self.hsv_cached() else None
+            return hsv[..., 2] if hsv is not None else self.representation('rgb').max(axis=-1)
+        if self.color_model == 'gray':
+            if model == 'rgb':  # GRAY -> RGB
+                return np.stack((self.arr,) * 3, axis=-1)
+            if model == 'hsv':  # GRAY -> HSV
+                zeros = np.zeros_like(self.arr)
+                return np.stack((zeros, zeros, self.arr), axis=-1)
+        elif model == 'rgb':  # HSV -> RGB
+            return hsv_to_rgb(self.arr)
+        elif model == 'hsv':  # RGB -> HSV
+            return rgb_to_hsv(self.arr)
+        raise ValueError(f"unsupported color model change: {self.color_model} -> {model}")
+
     def color_model_change(self, model):
+        ''' change arr to model, previous representation stays cached,
+        changing back is free until pixels change '''
         if model == self.color_model:  # do not change anything
             return
-        elif model == 'rgb' and self.color_model == 'hsv':  # HSV -> RGB
-            self.arr = hsv_to_rgb(self.arr)
-        elif model == 'hsv' and self.color_model == 'rgb':  # RGB -> HSV
-            # print("rgb max",self.arr.max())
-            self.arr = rgb_to_hsv(self.arr)
-            # print("v max",self.arr[:,:,2].max())
-        elif model == 'gray':  # RGB/HSV -> GRAY
-            self.color_model = 'hsv'  # convert to hsv
-            self.arr = self.arr[:,:,2] # use value only
-        elif model == 'rgb' and self.color_model == 'gray':  # GRAY -> RGB
-            self.arr = np.stack((self.arr)*3, axis=-1)
-        elif model == 'hsv' and self.color_model == 'gray':  # GRAY -> HSV
-            self.arr = np.stack((np.zeros_like(self.arr))*2, self.arr, axis=-1)
+        arr = self.representation(model)
+        reprs = {m: a for m, (v, a) in self._reprs.items()
+                 if v == self.version and m != model}
+        reprs[self.color_model] = self.arr
 
+        self.arr = arr
         self.color_model = model  # conversion done, update mode
+        self._reprs = {m: (self.version, a) for m, a in reprs.items()}
+        logging.info(f"color model {model}, cached: {list(self._reprs)}")
 
 
+    @npprofile.timed(name="npImage.load", cat="io")
     def load(self, fpath=None):
         if not fpath:
             logging.info("fpath input dialog")
+            from tkinter import filedialog  # gui only, batch runs headless
             fpath = filedialog.askopenfilename()
         if not fpath:
             return
@@ -91,15 +232,23 @@ class npImage():
         self.fpath = Fpath
         self.filetype = self.check_filetype()
 
-        self.arr = imread(Fpath)
-        self.bitdepth = self._get_bitdepth(self.arr) # orig bitdepth before conversion to float
+        if self.decoded_cache:  # shared read only, copied before edit
+            self.arr, info = self.decoded_cache.get(Fpath, self._decode, img_as_float)
+            self.bitdepth = info["bitdepth"]
+        else:
+            arr, info = self._decode(Fpath)
+            self.bitdepth = info["bitdepth"]
+            self.arr = img_as_float(arr)  # convert to float
         self.color_model = 'rgb' if self.channels == 3 else 'gray'
-
-        self.arr = img_as_float(self.arr)  # convert to float
+        npprofile.count("bytes", self.arr.nbytes)
         # self.original = self.arr.copy()
 
 
 
+    def _decode(self, fpath):
+        arr = imread(fpath)
+        return arr, {"bitdepth": self._get_bitdepth(arr)}  # orig bitdepth before conversion to float
+
     def _get_bitdepth(self, arr):
         ''' read bitdepth before conversion to float '''
         if arr.dtype == np.uint8:
@@ -110,16 +259,40 @@ class npImage():
             raise Exception(f"unsupported array type: {arr.dtype}")
 
 
-    def get_selection(self):
-        return self.arr[self.slice]
+    @property
+    def selection(self):
+        ''' (slice, mask) - kept by edits running in background '''
+        return self.slice, self.mask
+
+    def get_selection(self, selection=None):
+        ''' selected pixels to be edited (in place),
+        selection: (slice, mask), default current '''
+        region, _ = selection or self.selection
+        self.materialize()
+        return self.arr[region]
+
+    def set_selection(self, y, selection=None):
+        ''' write selection, blended by mask if any,
+        selection: (slice, mask), default current '''
+        region, mask = selection or self.selection
+        self.materialize()
+        if mask is None:
+            self.arr[region] = y
+        else:
+            mask.blend(self.arr[region], y)
+        self.changed()
 
-    def set_selection(self,  y):
-        self.arr[self.slice] = y
+    def selected_all(self):
+        ''' selection covers whole image '''
+        return self.mask is None and all(
+            s.indices(n)[:2] == (0, n)
+            for s, n in zip(self.slice[:2], self.arr.shape[:2]))
 
 
     def rgb2gray(self):
         if self.arr.ndim > 2:
-            self.arr = np.dot(self.arr[..., :3], [0.2989, 0.5870, 0.1140])
+            self.arr = self.luminance()
+            self.color_model = 'gray'
 
     def reset(self):
         self.arr = self.original.copy()
@@ -147,7 +320,6 @@ class npImage():
         fpath = fpath or self.fpath
         Fp = Path(fpath)
         logging.info(f"save to {Fp} bitdepth:{self.bitdepth} filetype:{self.filetype}")
-        print(f"save image {fpath}: {self.info()}")
 
         if Fp.is_file():
             try:
@@ -186,37 +358,90 @@ class npImage():
 
 
     def save_as(self, fpath=None):
-        fpath = fpath or filedialog.asksaveasfilename(defaultextension=".jpg")
+        if not fpath:
+            from tkinter import filedialog
+            fpath = filedialog.asksaveasfilename(defaultextension=".jpg")
         self._save_image(self.arr, fpath, bitdepth=self.bitdepth)
 
     def rotate(self, k=1):
-        ''' rotate array by 90 degrees
+        ''' rotate array by 90 degrees clockwise (lazy, no pixels moved)
         k = number of rotations
         '''
         # self.arr = ndimage.rotate(self.arr, angle=-90, reshape=True)
-        self.arr = np.rot90(self.arr, -k, axes=(0, 1))
-
+        self.transform = self.transform.rotate(k)
+        self.changed()
+
+    def mirror(self):
+        ''' mirror selection, whole image lazily '''
+        if self.selected_all():
+            self.transform = self.transform.mirror()
+            self.changed()
+        else:
+            self.set_selection(np.flip(self.get_selection(), 1))
 
-    def free_rotate(self, angle):
-        ''' rotate array
-        '''
-        from scipy.ndimage import rotate
-        self.arr = rotate(self.arr, angle,
-                                  reshape=True, mode='nearest')
+    def flip(self):
+        ''' flip selection upside down, whole image lazily '''
+        if self.selected_all():
+            self.transform = self.transform.flip()
+            self.changed()
+        else:
+            self.set_selection(np.flip(self.get_selection(), 0))
 
-        self.info()
-        self.arr = np.clip(self.arr, 0, 1)
 
+    def resize(self, shape=None, method='auto', scale=None):
+        ''' resize to shape (rows, cols) or by scale, float32,
+        method: 'area', 'bilinear', 'lanczos', 'auto' (area down, lanczos up)
+        '''
+        if shape is None:
+            shape = [n * scale for n in self.arr.shape[:2]]
+        self.arr = npgeometry.resize(self.arr, shape, method=method)
+
+    def view(self, zoom, method='area'):
+        ''' image downscaled zoom times for display, cached until pixels change,
+        level computed from finest cached level it is a multiple of (pyramid)
+        method: 'nearest' (every zoom-th pixel, no cache) or resize method '''
+        if zoom <= 1:
+            return self.arr
+        if method == 'nearest':
+            return self.arr[::zoom, ::zoom, ...]
+        cached = self._views.get((zoom, method))
+        if cached and cached[0] == self.version:
+            return cached[1]
+
+        src_zoom, src = 1, self.arr
+        for (z, m), (v, a) in self._views.items():
+            if m == method and v == self.version and zoom % z == 0 and z > src_zoom:
+                src_zoom, src = z, a
+        shape = [-(-n // zoom) for n in self.arr.shape[:2]]  # as arr[::zoom]
+        with npprofile.span(f"view zoom {zoom}", "render"):
+            npprofile.count("pixels", src.shape[0] * src.shape[1])
+            view = npgeometry.resize(src, shape, method=method)
+        logging.debug(f"view zoom {zoom} from level {src_zoom}")
+        self._views[(zoom, method)] = (self.version, view)
+        return view
+
+    def export(self, fpath, size, method='auto'):
+        ''' save copy resized to longer side size (pixels) '''
+        scale = size / max(self.arr.shape[:2])
+        shape = [n * scale for n in self.arr.shape[:2]]
+        arr = npgeometry.resize(self.arr, shape, method=method)
+        logging.info(f"export {fpath} {arr.shape}")
+        self._save_image(arr, fpath, bitdepth=self.bitdepth)
+
+    def free_rotate(self, angle, order=1, threads=npgeometry.TILE_THREADS):
+        ''' rotate array counter-clockwise (degrees), float32,
+        order: interpolation 0 nearest, 1 linear, 3 cubic (slow)
+        '''
+        self.arr = npgeometry.rotate(self.arr, angle, order=order,
+                                     threads=threads)
 
-    def crop(self, x0, y0, x1, y1):
 
-        # ensure crop area in image
-        #        x0 = int(max(x0, 0))
-        #        x1 = int(min(x1, self.arr.shape[1]))
-        #        y1 = int(min(y1, self.arr.shape[0]))
-        #        y0 = int(max(y0, 0))
-        logging.info(f"apply crop: {x0} {x1} {y0} {y1}")
-        self.arr = self.arr[self.slice]
+    def crop(self, *box):
+        ''' crop to box (row0, row1, col0, col1) in pixels, default selection box, lazy '''
+        rows, cols = (slice(*box[:2]), slice(*box[2:])) if box else self.slice[:2]
+        logging.info(f"apply crop: {rows} {cols}")
+        self.transform = self.transform.crop(rows, cols, self._base.shape)
+        self.changed()
 #        self.info() # slow
 
 
@@ -256,34 +481,135 @@ class npImage():
 
 
 
-    def make_fft(self):
-        from scipy import fftpack
-        # Take the fourier transform of the image.
-        y = 255 * self.arr
-        F1 = fftpack.fft2(y)
-        # Now shift the quadrants around so that low spatial frequencies are in
-        # the center of the 2D fourier transformed image.
-        F2 = fftpack.fftshift(F1)
-
-        y = 20 * np.log10(np.abs(F2.real) + .1)
-        y /= 255
-        self.fft = F2
-        self.arr = y
-        logging.info("fft created")
-
+    def make_fft(self, mode=None):
+        ''' real fft of image, arr is replaced by magnitude display,
+        spectrum of image returned by make_ifft is reused if not edited
+        mode: 'channels' - spectrum of each channel,
+              'luminance' - spectrum of gray image '''
+        from scipy import fft
+        mode = mode or self.fft_mode
+        cache = self._fft_cache
+        if cache and cache["version"] == self.version and cache["mode"] == mode:
+            logging.info("fft from cache")
+            spectrum, display = cache["spectrum"], cache["display"]
+        else:
+            y = self.luminance() if mode == 'luminance' else self.arr
+            y = y.astype(np.float32, copy=False)  # complex64 spectrum
+            spectrum = fft.rfft2(y, axes=(0, 1), workers=self.fft_workers)
+            display = None
+
+        self._fft_state = {"shape": self.arr.shape[:2],
+                           "dtype": self.arr.dtype,
+                           "mode": mode,
+                           "color_model": self.color_model,
+                           }
+        self.fft = spectrum
+        self.arr = display if display is not None else self._fft_display()
+        if mode == 'luminance':
+            self.color_model = 'gray'
+        self._fft_state["version"] = self.version  # display not edited
+        self._fft_cache = None
+        logging.info(f"fft created {spectrum.shape} {spectrum.dtype}")
+
+    def _fft_display(self):
+        ''' log magnitude of full spectrum, low frequencies in center,
+        computed on half spectrum and mirrored (conjugate symmetry) '''
+        h, w = self._fft_state["shape"]
+        mag = np.abs(self.fft)
+        mag *= 255
+        mag += .1
+        np.log10(mag, out=mag)
+        mag *= 20 / 255
+        full = np.empty((h, w) + mag.shape[2:], dtype=mag.dtype)
+        full[:, :w // 2 + 1] = mag
+        v = np.arange(w // 2 + 1, w)
+        full[:, v] = mag[-np.arange(h) % h][:, w - v]  # |F(u,v)| = |F(-u,-v)|
+        return np.fft.fftshift(full, axes=(0, 1))
+
+    def _fft_half_mask(self, mask):
+        ''' mask on display (full shifted spectrum) -> mask on half spectrum,
+        points in dropped half select their conjugate partners '''
+        h, w = self._fft_state["shape"]
+        m = np.fft.ifftshift(mask, axes=(0, 1))
+        half = m[:, :w // 2 + 1].copy()
+        v = np.arange(w // 2 + 1, w)
+        half[:, w - v] |= m[-np.arange(h) % h][:, v]
+        return half
+
+    def fft_delete(self, slice):
+        ''' zero spectrum in display selection (and its symmetric part) '''
+        if self.fft is None:
+            return
+        mask = np.zeros(self._fft_state["shape"], dtype=bool)
+        mask[slice[:2]] = True
+        spectrum = self.fft.copy()  # history keeps old one
+        spectrum[self._fft_half_mask(mask)] = 0
+        self.fft = spectrum
+
+    def fft_filter(self, kind, *cutoffs, shape='gaussian', order=2):
+        ''' lowpass (cutoff), highpass (cutoff) or bandpass (low, high),
+        cutoffs in pixels from fft display center,
+        shape 'gaussian' or 'butterworth' (of order) '''
+        func = {"lowpass": npfft.lowpass,
+                "highpass": npfft.highpass,
+                "bandpass": npfft.bandpass,
+                }[kind]
+        self._fft_apply(lambda fshape: func(npfft.distances(fshape), *cutoffs,
+                                            shape=shape, order=order))
+
+    def fft_notch(self, centers, radius):
+        ''' remove peaks at centers (rows, cols of fft display)
+        and symmetric ones, eg. halftone or moire pattern '''
+        def transfer(fshape):
+            h, w = fshape
+            rel = [(r - h // 2, c - w // 2) for r, c in centers]
+            return npfft.notch(fshape, rel, radius)
+        self._fft_apply(transfer)
+
+    def _fft_apply(self, transfer):
+        ''' multiply spectrum by transfer(image shape),
+        in fft mode update display, otherwise filter image by fft roundtrip '''
+        in_fft = self.fft is not None
+        if not in_fft:
+            self.make_fft(mode='channels')
+        if in_fft:  # history keeps old spectrum
+            self.fft = self.fft.copy()
+        npfft.apply_transfer(self.fft, transfer(self._fft_state["shape"]))
+        if in_fft:
+            self.arr = self._fft_display()
+            self._fft_state["version"] = self.version
+        else:
+            self.make_ifft()
 
     def make_ifft(self):
         if self.fft is None:
             logging.info("no fft image")
             return
 
-        from scipy import fftpack
-        F2 = self.fft
-        F1 = fftpack.ifftshift(F2)
-        y = fftpack.ifft2(F1).real
-        y = normalize(y)
+        from scipy import fft
+        state = self._fft_state
+        display_edited = self.version != state["version"]
+        y = fft.irfft2(self.fft, s=state["shape"], axes=(0, 1),
+                       workers=self.fft_workers)
+        y = y.astype(state["dtype"], copy=False)
+        if y.min() < -FFT_TOLERANCE or y.max() > 1 + FFT_TOLERANCE:
+            y = normalize(y)  # spectrum edited, eg. DC deleted
+            spectrum = None
+        else:
+            y = np.clip(y, 0, 1, out=y)
+            spectrum = self.fft
+
+        display = None if display_edited else self.arr
         self.arr = y
+        if state["mode"] != 'luminance':
+            self.color_model = state["color_model"]
         self.fft = None
+        if spectrum is not None:  # toggling back is free until image changes
+            self._fft_cache = {"version": self.version,
+                               "mode": state["mode"],
+                               "spectrum": spectrum,
+                               "display": display,
+                               }
 
     def fft_toggle(self):
         if self.fft is None:
@@ -337,7 +663,8 @@ def pil_to_np(im):
 
 def blur(y, radius):
     from scipy.ndimage import gaussian_filter
-    return gaussian_filter(y, radius) 
+    sigma = (radius, radius, 0)[:y.ndim]  # do not blur across channels
+    return gaussian_filter(y, sigma)
 
 def gray(y):
     if y.ndim == 2:
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import numpy as np
+
+'''
+selection masks stored cropped to their bounding box,
+filters run on the box only, result is blended by the mask
+
+coordinates are image pixels, points are (x, y) = (col, row)
+'''
+
+
+class Mask:
+    '''
+    boolean mask of selected pixels in box (rows, cols slices of image)
+    '''
+
+    def __init__(self, rows, cols, mask):
+        self.rows = rows
+        self.cols = cols
+        self.mask = mask
+
+    def __repr__(self):
+        return (f"Mask(rows={self.rows.start}:{self.rows.stop}, "
+                f"cols={self.cols.start}:{self.cols.stop}, area={self.area})")
+
+    @property
+    def slice(self):
+        return np.s_[self.rows, self.cols, ...]
+
+    @property
+    def area(self):
+        return int(np.count_nonzero(self.mask))
+
+    def shrink(self):
+        ''' crop to bounding box of selected pixels, None if empty '''
+        rows = np.flatnonzero(self.mask.any(axis=1))
+        cols = np.flatnonzero(self.mask.any(axis=0))
+        if not len(rows):
+            return None
+        r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        return Mask(slice(self.rows.start + r0, self.rows.start + r1),
+                    slice(self.cols.start + c0, self.cols.start + c1),
+                    self.mask[r0:r1, c0:c1])
+
+    def blend(self, box, y):
+        ''' write y to box (selected image pixels) where mask is set '''
+        where = self.mask if box.ndim == 2 else self.mask[..., None]
+        np.copyto(box, y, where=where)
+
+    @classmethod
+    def box(cls, shape, x0, y0, x1, y1):
+        ''' rectangle clipped to image shape '''
+        h, w = shape[:2]
+        r0, r1 = int(np.clip(min(y0, y1), 0, h)), int(np.clip(max(y0, y1), 0, h))
+        c0, c1 = int(np.clip(min(x0, x1), 0, w)), int(np.clip(max(x0, x1), 0, w))
+        return cls(slice(r0, r1), slice(c0, c1),
+                   np.ones((r1 - r0, c1 - c0), dtype=bool))
+
+    @classmethod
+    def ellipse(cls, shape, x0, y0, x1, y1):
+        ''' ellipse inscribed in rectangle, pixel centers inside are selected '''
+        m = cls.box(shape, x0, y0, x1, y1)
+        cy, cx = (y0 + y1) / 2, (x0 + x1) / 2
+        ry, rx = max(abs(y1 - y0) / 2, .5), max(abs(x1 - x0) / 2, .5)
+        r, c = np.ogrid[m.rows, m.cols]
+        m.mask = ((r + .5 - cy) / ry) ** 2 + ((c + .5 - cx) / rx) ** 2 <= 1
+        return m.shrink()
+
+    @classmethod
+    def polygon(cls, shape, points):
+        ''' polygon of (x, y) vertices, even-odd rule on pixel centers '''
+        pts = np.asarray(points, dtype=float)
+        if len(pts) < 3:
+            return None
+        x, y = pts[:, 0], pts[:, 1]
+        m = cls.box(shape, x.min(), y.min(), np.ceil(x.max()), np.ceil(y.max()))
+        h, w = m.mask.shape
+        # crossings of each edge with row centers toggle pixels right of them
+        toggles = np.zeros((h, w + 1), dtype=np.int32)
+        rc = np.arange(h) + m.rows.start + .5
+        for (xa, ya), (xb, yb) in zip(pts, np.roll(pts, -1, axis=0)):
+            rows = np.flatnonzero((ya <= rc) != (yb <= rc))
+            if not len(rows):
+                continue
+            xi = xa + (rc[rows] - ya) * (xb - xa) / (yb - ya) - m.cols.start
+            np.add.at(toggles, (rows, np.clip(np.ceil(xi - .5), 0, w).astype(int)), 1)
+        m.mask = np.cumsum(toggles[:, :w], axis=1) % 2 == 1
+        return m.shrink()
+
+    @classmethod
+    def threshold(cls, lum, rows, cols, low, high):
+        ''' pixels of luminance in low..high,
+        lum: luminance of box (rows, cols slices of image) '''
+        return cls(rows, cols, (lum >= low) & (lum <= high)).shrink()
+
+    @classmethod
+    def magic_wand(cls, lum, rows, cols, seed, tolerance):
+        ''' connected pixels of luminance similar to seed (x, y),
+        lum: luminance of box (rows, cols slices of image) '''
+        from scipy import ndimage
+        sx, sy = int(seed[0]) - cols.start, int(seed[1]) - rows.start
+        if not (0 <= sy < lum.shape[0] and 0 <= sx < lum.shape[1]):
+            return None
+        similar = np.abs(lum - lum[sy, sx]) <= tolerance
+        labels, _ = ndimage.label(similar)
+        return cls(rows, cols, labels == labels[sy, sx]).shrink()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import logging
+import os
+
+import numpy as np
+
+'''
+memory accounting - image, history and caches report their arrays,
+arrays shared between them (history snapshots of image) are counted once,
+over limit, evictors free memory in order (cache trim, pyramid level drop,
+history spill to disk) before the process runs out of memory
+'''
+
+MEMORY_FRACTION = .5  # default limit, part of physical memory
+
+
+def physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 4 * 2 ** 30  # not posix, assume 4 GB
+
+
+def process_memory():
+    ''' resident set size of process in bytes, None if unknown '''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def owner(arr):
+    ''' array owning memory of view '''
+    while isinstance(arr.base, np.ndarray):
+        arr = arr.base
+    return arr
+
+
+def _in_ram(arr):
+    ''' memory mapped arrays are backed by files, not counted '''
+    return not isinstance(arr, np.memmap)
+
+
+class Accountant:
+    '''
+    sources report arrays they keep alive: arrays() -> iterable of arrays,
+    evictors free memory when total is over limit: evict(nbytes) -> freed bytes
+    '''
+
+    def __init__(self, limit=None):
+        self.limit = limit or physical_memory() * MEMORY_FRACTION
+        self.sources = {}  # name: arrays callback, in reporting order
+        self.evictors = {}  # name: (priority, evict callback)
+
+    def register(self, name, arrays, evict=None, priority=0):
+        ''' evictors of lower priority run first '''
+        self.sources[name] = arrays
+        if evict:
+            self.evictors[name] = (priority, evict)
+
+    def unregister(self, name):
+        self.sources.pop(name, None)
+        self.evictors.pop(name, None)
+
+    def usage(self):
+        ''' {name: bytes}, shared arrays count for first source reporting them '''
+        seen, usage = set(), {}
+        for name, arrays in self.sources.items():
+            total = 0
+            for a in arrays():
+                if a is None:
+                    continue
+                root = owner(a)
+                if id(root) not in seen and _in_ram(root):
+                    seen.add(id(root))
+                    total += root.nbytes
+            usage[name] = total
+        return usage
+
+    def total(self):
+        return sum(self.usage().values())
+
+    def check(self):
+        ''' evict until total is under limit, returns total '''
+        total = self.total()
+        for name, (_, evict) in sorted(self.evictors.items(), key=lambda e: e[1][0]):
+            if total <= self.limit:
+                break
+            logging.info(f"memory {total / 2**20:.0f} MB over limit "
+                         f"{self.limit / 2**20:.0f} MB, evict {name}")
+            evict(total - self.limit)
+            total = self.total()
+        if total > self.limit:
+            logging.warning(f"memory {total / 2**20:.0f} MB over limit, nothing to evict")
+        return total
+
+
+accountant = Accountant()  # of the application
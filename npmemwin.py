@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import tkinter as tk
+
+import npmemory
+
+#  ------------------------------------------
+#  MEMORY
+#  ------------------------------------------
+
+
+class memoryWin(tk.Toplevel):
+    '''
+    bytes kept by image, history and caches (npmemory accountant),
+    total against limit and resident memory of process
+    '''
+
+    def __init__(self, hide=True, master=None, accountant=npmemory.accountant):
+        super().__init__(master)
+        self.title("Memory")
+        self.master = master
+        self.accountant = accountant
+        self.geometry("190x230")
+        self.hidden = hide
+        self.frame = tk.Frame(self)
+        if self.hidden:
+            self.withdraw()
+
+    def update(self):
+
+        if self.hidden:
+            return
+        self.frame.destroy()
+        self.frame = tk.Frame(self)
+        self._draw_table()
+
+    def _draw_table(self):
+
+        usage = self.accountant.usage()
+        rss = npmemory.process_memory()
+        rows = {name: _mb(n) for name, n in usage.items()}
+        rows["total"] = _mb(sum(usage.values()))
+        rows["limit"] = _mb(self.accountant.limit)
+        rows["process"] = _mb(rss) if rss is not None else "?"
+
+        for r, (k, v) in enumerate(rows.items()):
+            bg = "#ffffff" if r % 2 else "#ddffee"  # alternating row colors
+            tk.Label(self.frame, text=k, font=(None, 9),
+                     background=bg, width=9).grid(row=r, column=1)
+            tk.Label(self.frame, text=v, font=(None, 9),
+                     background=bg, width=9).grid(row=r, column=2)
+
+        self.frame.pack(side=tk.LEFT)
+
+
+def _mb(nbytes):
+    return f"{nbytes / 2**20:.0f} MB"
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import threading
+
+'''
+command parameters - askfloat in commands either asks user
+or returns replayed values (preview, repeated command, macro),
+values used by command can be recorded (macro)
+'''
+
+_local = threading.local()  # replay / recorder active in current thread
+
+
+class Replay:
+    ''' context manager: askfloat returns given values instead of asking,
+    missing values are replaced by initialvalue,
+    spatial values (radius in pixels) are divided by scale
+    (preview on downsampled view)
+    '''
+
+    def __init__(self, values=(), scale=1):
+        self.values = list(values)
+        self.scale = scale
+
+    def __enter__(self):
+        self._previous = getattr(_local, "replay", None)
+        _local.replay = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.replay = self._previous
+
+    def next(self, initialvalue=None, spatial=False):
+        value = self.values.pop(0) if self.values else initialvalue
+        value = float(value)
+        if spatial:
+            value /= self.scale
+        return value
+
+
+def replaying():
+    ''' Replay active in current thread or None '''
+    return getattr(_local, "replay", None)
+
+
+class Recorder:
+    ''' context manager: collects parameters used by command (askfloat) '''
+
+    def __init__(self):
+        self.values = []
+
+    def __enter__(self):
+        self._previous = getattr(_local, "recorder", None)
+        _local.recorder = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.recorder = self._previous
+
+    def add(self, value):
+        self.values.append(value)
+
+
+def recording():
+    ''' Recorder active in current thread or None '''
+    return getattr(_local, "recorder", None)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque, Counter
+from functools import wraps
+
+'''
+timing instrumentation - nested spans timed by perf_counter_ns,
+counters (pixels, bytes) of span, recent spans kept in ring buffer,
+shown in profile window, exported as chrome trace (chrome://tracing, perfetto)
+
+    with span("unsharp_mask"):
+        count("pixels", y.size)
+        ...
+
+    @timed
+    def draw(self):
+'''
+
+RING_SIZE = 2000  # finished spans kept
+
+enabled = True
+spans = deque(maxlen=RING_SIZE)  # finished spans, oldest first
+totals = Counter()  # counters of all spans and outside spans
+_local = threading.local()  # stack of open spans of thread
+_t0 = time.perf_counter_ns()
+
+
+class span:
+    '''
+    context manager timing block of code, spans may be nested,
+    finished span is added to ring buffer:
+    name, cat, start (ns since import), dur (ns), thread, depth, counters
+    '''
+
+    def __init__(self, name, cat="app"):
+        self.name = name
+        self.cat = cat
+        self.counters = {}
+
+    def __enter__(self):
+        if enabled:
+            stack = _stack()
+            self.depth = len(stack)
+            stack.append(self)
+            self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        if not enabled or not hasattr(self, "start"):
+            return False
+        end = time.perf_counter_ns()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        thread = threading.current_thread()
+        spans.append({"name": self.name, "cat": self.cat,
+                      "start": self.start - _t0, "dur": end - self.start,
+                      "tid": thread.ident, "thread": thread.name,
+                      "depth": self.depth, "counters": self.counters})
+        logging.debug(f"{self.name}: {(end - self.start) / 1e6:.1f} ms {self.counters or ''}")
+        return False
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def count(name, value=1):
+    ''' add to counter of innermost open span of thread and to totals '''
+    if not enabled:
+        return
+    totals[name] += value
+    stack = _stack()
+    if stack:
+        counters = stack[-1].counters
+        counters[name] = counters.get(name, 0) + value
+
+
+def timed(func=None, *, name=None, cat="app"):
+    ''' decorator, calls of function are spans '''
+    if func is None:
+        return lambda func: timed(func, name=name, cat=cat)
+    span_name = name or func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(span_name, cat):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def recent(n=None):
+    ''' last n finished spans, oldest first '''
+    items = list(spans)
+    return items[-n:] if n else items
+
+
+def summary():
+    ''' {name: {count, total_ms, mean_ms, max_ms}} of spans in ring buffer,
+    slowest total first '''
+    stats = {}
+    for s in list(spans):
+        st = stats.setdefault(s["name"], {"count": 0, "total_ms": 0., "max_ms": 0.})
+        ms = s["dur"] / 1e6
+        st["count"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+    for st in stats.values():
+        st["mean_ms"] = st["total_ms"] / st["count"]
+    return dict(sorted(stats.items(), key=lambda item: -item[1]["total_ms"]))
+
+
+def clear():
+    spans.clear()
+    totals.clear()
+
+
+def chrome_trace():
+    ''' spans in chrome trace event format (complete events, microseconds) '''
+    pid = os.getpid()
+    events, threads = [], {}
+    for s in list(spans):
+        threads[s["tid"]] = s["thread"]
+        events.append({"name": s["name"], "cat": s["cat"], "ph": "X",
+                       "ts": s["start"] / 1e3, "dur": s["dur"] / 1e3,
+                       "pid": pid, "tid": s["tid"], "args": s["counters"]})
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": name}} for tid, name in threads.items()]
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"totals": dict(totals)}}
+
+
+def export_chrome_trace(fpath):
+    with open(fpath, "w") as f:
+        json.dump(chrome_trace(), f)
+    logging.info(f"trace of {len(spans)} spans saved to {fpath}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import tkinter as tk
+from tkinter import filedialog
+
+import npprofile
+
+#  ------------------------------------------
+#  PROFILE
+#  ------------------------------------------
+
+
+class profileWin(tk.Toplevel):
+    '''
+    slowest operations and recent spans from npprofile ring buffer,
+    refreshed while shown
+    '''
+
+    REFRESH_MS = 1000
+    RECENT = 40  # spans listed
+
+    def __init__(self, hide=True, master=None):
+        super().__init__(master)
+        self.title("Profile")
+        self.master = master
+        self.geometry("520x480")
+        self.hidden = hide
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+
+        buttons = tk.Frame(self)
+        tk.Button(buttons, text="Clear", command=self.clear).pack(side=tk.LEFT)
+        tk.Button(buttons, text="Export trace", command=self.export).pack(side=tk.LEFT)
+        buttons.pack(side=tk.TOP, fill=tk.X)
+        self.text = tk.Text(self, font=("Courier", 8), wrap=tk.NONE)
+        self.text.pack(fill=tk.BOTH, expand=tk.YES)
+        self._shown = None  # last span shown, redraw only when new spans
+        self._refresh = None  # scheduled update
+        if self.hidden:
+            self.withdraw()
+
+    def hide(self):
+        self.withdraw()
+        self.hidden = True
+
+    def update(self):
+        if self.hidden:
+            return
+        last = npprofile.spans[-1] if npprofile.spans else None
+        if last is not self._shown:
+            self._shown = last
+            self._draw_text()
+        if self._refresh:
+            self.after_cancel(self._refresh)
+        self._refresh = self.after(self.REFRESH_MS, self.update)
+
+    def _draw_text(self):
+        lines = [f"{'operation':32} {'count':>6} {'total ms':>10} {'mean':>8} {'max':>8}"]
+        for name, st in list(npprofile.summary().items())[:15]:
+            lines.append(f"{name[:32]:32} {st['count']:6} {st['total_ms']:10.1f} "
+                         f"{st['mean_ms']:8.1f} {st['max_ms']:8.1f}")
+        if npprofile.totals:
+            lines.append("")
+            lines += [f"{k}: {v:,}" for k, v in npprofile.totals.items()]
+        lines += ["", "recent:"]
+        for s in reversed(npprofile.recent(self.RECENT)):
+            counters = " ".join(f"{k}={v:,}" for k, v in s["counters"].items())
+            lines.append(f"{'  ' * s['depth']}{s['name']} {s['dur'] / 1e6:.1f} ms "
+                         f"[{s['thread']}] {counters}")
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+
+    def clear(self):
+        npprofile.clear()
+        self._shown = None
+        self.text.delete("1.0", tk.END)
+
+    def export(self):
+        fpath = filedialog.asksaveasfilename(
+            master=self, defaultextension=".json", initialfile="npyshop_trace.json",
+            filetypes=[("chrome trace", "*.json")])
+        if fpath:
+            npprofile.export_chrome_trace(fpath)
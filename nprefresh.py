@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import logging
+
+
+class RefreshScheduler:
+    '''
+    mark views dirty and repaint them once when tk is idle,
+    many requests in a row (mouse wheel, repeated edits)
+    are coalesced into one redraw
+    '''
+
+    def __init__(self, master):
+        self.master = master
+        self.views = {}  # name: redraw callback, in drawing order
+        self.dirty = set()
+        self._pending = None  # after_idle id
+
+    def register(self, name, callback):
+        self.views[name] = callback
+
+    def request(self, *names):
+        ''' mark views dirty (all if no name given), schedule redraw '''
+        self.dirty.update(names or self.views)
+        if self._pending is None:
+            self._pending = self.master.after_idle(self._flush)
+        else:
+            logging.debug(f"refresh coalesced: {sorted(self.dirty)}")
+
+    def flush(self):
+        ''' redraw dirty views now '''
+        if self._pending is not None:
+            self.master.after_cancel(self._pending)
+        self._flush()
+
+    def _flush(self):
+        self._pending = None
+        dirty, self.dirty = self.dirty, set()
+        for name, callback in self.views.items():
+            if name in dirty:
+                callback()
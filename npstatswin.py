@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import tkinter as tk
-from testing.timeit import timeit
+from npprofile import timed
 
 #  ------------------------------------------
 #  STATISTICS
@@ -8,7 +8,7 @@ from testing.timeit import timeit
 
 
 class statsWin(tk.Toplevel):
-    @timeit
+    @timed
     def __init__(self, hide=True, master=None):
         super().__init__(master)
         self.title("Stats")
@@ -22,7 +22,7 @@ class statsWin(tk.Toplevel):
             self.withdraw()
 
 
-    @timeit
+    @timed
     def update(self):
 
         if self.hidden:
@@ -30,7 +30,7 @@ class statsWin(tk.Toplevel):
         self.frame.grid_forget()
         self._draw_table()
 
-#    @timeit
+#    @timed
     def _draw_table(self):
 
         for r, k in enumerate(self.master.img.stats):  # loop stats dictionary
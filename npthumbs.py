@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from npcache import fingerprint
+
+'''
+thumbnails of image files - decoded at reduced scale (jpeg draft),
+made in background pool, cached on disk by path, mtime and size
+'''
+
+THUMB_SIZE = 160  # pixels, longer side
+THUMB_THREADS = os.cpu_count() or 1
+CACHE_DIR = Path.home() / ".cache" / "npyshop" / "thumbs"
+
+
+def cache_path(fpath, size=THUMB_SIZE, cache_dir=CACHE_DIR):
+    key = hashlib.sha1(f"{fingerprint(fpath)}|{size}".encode()).hexdigest()
+    return Path(cache_dir) / f"{key}.jpg"
+
+
+def _to_8bit(im):
+    ''' 8bit gray or rgb, as can be shown and saved as jpeg '''
+    if im.mode.startswith("I;16") or im.mode == "I":
+        arr = np.asarray(im, dtype=np.uint32) >> 8  # 16bit -> 8bit
+        return Image.fromarray(arr.astype(np.uint8), "L")
+    if im.mode not in ("L", "RGB"):
+        return im.convert("RGB")
+    return im
+
+
+def make_thumbnail(fpath, size=THUMB_SIZE):
+    ''' small preview of image file, jpeg is decoded at 1/2 - 1/8 scale '''
+    with Image.open(fpath) as im:
+        im.draft("RGB", (size, size))  # no effect on other formats
+        im = _to_8bit(im)
+        im.thumbnail((size, size), Image.BILINEAR)
+    return im
+
+
+class ThumbnailCache:
+    '''
+    thumbnails from disk cache or made in background threads
+    '''
+
+    def __init__(self, cache_dir=CACHE_DIR, size=THUMB_SIZE, threads=THUMB_THREADS):
+        self.cache_dir = Path(cache_dir)
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def get(self, fpath):
+        ''' thumbnail (PIL image) of file, blocking '''
+        cached = cache_path(fpath, self.size, self.cache_dir)
+        if cached.is_file():
+            with Image.open(cached) as im:
+                im.load()
+                return im
+        im = make_thumbnail(fpath, self.size)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            im.save(cached, quality=85)
+        except OSError as e:
+            logging.info(f"thumbnail not cached {cached}: {e}")
+        return im
+
+    def request(self, fpaths, callback):
+        ''' make thumbnails in background, callback(fpath, image or None)
+        is called from pool thread, returns futures (can be cancelled) '''
+        return [self.pool.submit(self._load, fpath, callback) for fpath in fpaths]
+
+    def _load(self, fpath, callback):
+        try:
+            im = self.get(fpath)
+        except Exception as e:
+            logging.info(f"thumbnail failed {fpath}: {e}")
+            im = None
+        callback(fpath, im)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import queue
+import tkinter as tk
+from pathlib import Path
+
+from PIL import ImageTk
+
+import npthumbs
+
+#  ------------------------------------------
+#  CONTACT SHEET
+#  ------------------------------------------
+
+
+class sheetWin(tk.Toplevel):
+    '''
+    scrollable grid of thumbnails, click opens image,
+    thumbnails are made in background and shown as they come
+    '''
+
+    POLL_MS = 50
+
+    def __init__(self, master=None, on_open=None, size=npthumbs.THUMB_SIZE,
+                 columns=6):
+        super().__init__(master)
+        self.title("Contact sheet")
+        self.master = master
+        self.on_open = on_open
+        self.size = size
+        self.columns = columns
+        self.cell = size + 24  # thumbnail and file name
+        self.cache = npthumbs.ThumbnailCache(size=size)
+        self.geometry(f"{columns * self.cell + 20}x{3 * self.cell}")
+
+        self.canvas = tk.Canvas(self, background="gray20")
+        scrollbar = tk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=tk.YES)
+        self.canvas.bind("<Button-4>", lambda event: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.canvas.yview_scroll(1, "units"))
+        self.canvas.bind("<MouseWheel>", lambda event: self.canvas.yview_scroll(
+            -1 if event.delta > 0 else 1, "units"))
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.files = []
+        self.photos = {}  # fpath: PhotoImage, keep references
+        self.futures = []
+        self.ready = queue.Queue()  # (fpath, image) from thumbnail threads
+        self.polling = False
+
+    def show(self, files):
+        ''' grid of files, thumbnails requested in background '''
+        self.deiconify()
+        for f in self.futures:  # previous folder
+            f.cancel()
+        self.canvas.delete("all")
+        self.files = list(files)
+        self.photos = {}
+        for i, fpath in enumerate(self.files):
+            x, y = self._cell_xy(i)
+            tag = f"cell{i}"
+            self.canvas.create_rectangle(x, y, x + self.size, y + self.size,
+                                         outline="gray40", tags=tag)
+            self.canvas.create_text(x + self.size / 2, y + self.size + 10,
+                                    text=Path(fpath).name[:24], fill="white",
+                                    font=(None, 8), tags=tag)
+            self.canvas.tag_bind(tag, "<Button-1>",
+                                 lambda event, fpath=fpath: self._open(fpath))
+        rows = -(-len(self.files) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell, rows * self.cell))
+        self.futures = self.cache.request(self.files, lambda f, im: self.ready.put((f, im)))
+        if not self.polling:
+            self.polling = True
+            self._poll()
+
+    def hide(self):
+        for f in self.futures:
+            f.cancel()
+        self.withdraw()
+
+    def _cell_xy(self, i):
+        r, c = divmod(i, self.columns)
+        return c * self.cell + 4, r * self.cell + 4
+
+    def _open(self, fpath):
+        if self.on_open:
+            self.on_open(fpath)
+
+    def _poll(self):
+        ''' show finished thumbnails, tk only in main thread '''
+        while True:
+            try:
+                fpath, im = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            if im is None or fpath not in self.files:
+                continue
+            i = self.files.index(fpath)
+            x, y = self._cell_xy(i)
+            photo = ImageTk.PhotoImage(im, master=self)
+            self.photos[fpath] = photo
+            item = self.canvas.create_image(x + self.size / 2, y + self.size / 2,
+                                            image=photo, tags=f"cell{i}")
+            self.canvas.tag_bind(item, "<Button-1>",
+                                 lambda event, fpath=fpath: self._open(fpath))
+        if any(not f.done() for f in self.futures) or not self.ready.empty():
+            self.after(self.POLL_MS, self._poll)
+        else:
+            self.polling = False
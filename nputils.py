@@ -6,16 +6,16 @@ import re
 
 import numpy as np
 
-from matplotlib import pyplot as plt
 
 from pathlib import Path
 
 from imageio import imread, imwrite
 
 from skimage_dtype import img_as_float, img_as_ubyte, img_as_uint
-from matplotlib.colors import rgb_to_hsv, hsv_to_rgb
+from npcolors import rgb_to_hsv, hsv_to_rgb
+from npfilters import apply_to_value
 
-from testing.timeit import timeit
+from npprofile import timed
 
 from PIL import Image
 Image.MAX_IMAGE_PIXELS = 933120000
@@ -24,13 +24,13 @@ def rgb2gray(rgb):
     return np.dot(rgb[..., :3], [0.2989, 0.5870, 0.1140])
 
 
-@timeit
+@timed
 def int_to_float(arr):
     ''' twice as fast then (arr / 255).astype(np.float) '''
     return img_as_float(arr)
 
 
-@timeit
+@timed
 def float_to_int(arr, bitdepth):
     ''' '''
     if bitdepth == 8:
@@ -39,7 +39,7 @@ def float_to_int(arr, bitdepth):
         return img_as_uint(arr)
 
 
-@timeit
+@timed
 def load_image(fp):
     ''' load image from fp and return numpy uint8 or uint16 '''
     return imread(fp)  # imageio faster
@@ -66,7 +66,7 @@ def normalize(y, inrange=None, outrange=(0, 1)):
                    a_min=omin, a_max=omax)
 
 
-@timeit
+@timed
 def save_image(float_arr, fp_out, bitdepth=8):
     ''' '''
 
@@ -86,6 +86,7 @@ def save_image(float_arr, fp_out, bitdepth=8):
 
 
 def plti(im, name="", plot_axis=False, vmin=0, vmax=1, **kwargs):
+    from matplotlib import pyplot as plt  # not needed headless (npbatch)
 
     cmap = "gray" if im.ndim == 2 else "jet"
     plt.title(name)
@@ -141,7 +142,16 @@ def work_with_hsv_decorator(decorated_f):
         return y
     return wrapper_f
 
-@work_with_hsv_decorator
+
+def work_with_value_decorator(decorated_f):
+    ''' faster work_with_hsv_decorator for filters changing value only,
+    rgb is scaled by new / old value, hue and saturation are not computed '''
+
+    def wrapper_f(arr, *args, **kwargs):
+        return apply_to_value(lambda v: decorated_f(arr=v, *args, **kwargs), arr)
+    return wrapper_f
+
+@work_with_value_decorator
 def gamma(arr, g):
     """gamma correction of an numpy float image, where
     gamma = 1. : no effect
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import logging
+import queue
+import threading
+import time
+from functools import wraps
+
+import npprofile
+
+'''
+run heavy commands in background thread, keep tk main loop responsive
+
+tk is not thread safe - worker thread must not touch widgets,
+dialogs called from worker are passed to main thread (in_main_thread)
+'''
+
+_main_calls = queue.Queue()  # tk calls requested by worker thread
+_local = threading.local()   # job running in current thread
+
+
+class Cancelled(Exception):
+    pass
+
+
+def in_main_thread(func):
+    ''' decorator: run function in tk main thread,
+    worker thread waits for the result '''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if threading.current_thread() is threading.main_thread():
+            return func(*args, **kwargs)
+        call = {"func": func, "args": args, "kwargs": kwargs,
+                "done": threading.Event()}
+        _main_calls.put(call)
+        call["done"].wait()
+        if "error" in call:
+            raise call["error"]
+        return call["result"]
+    return wrapper
+
+
+def check_cancelled():
+    ''' call from long loops, raise Cancelled if user cancelled the job '''
+    cancel_checker()()
+
+
+def cancel_checker():
+    ''' check_cancelled of job of current thread,
+    can be called from other threads (tiles, channels in thread pool) '''
+    job = getattr(_local, "job", None)
+
+    def check():
+        if job and job["cancelled"].is_set():
+            raise Cancelled(f"{job['name']} cancelled")
+    return check
+
+
+def report_progress(fraction):
+    ''' call from long loops, fraction 0..1 is shown in status '''
+    job = getattr(_local, "job", None)
+    if job:
+        job["progress"] = fraction
+
+
+class Worker:
+    '''
+    run one job at a time in background thread,
+    poll it from tk main loop, call on_done(result) in main thread
+    '''
+
+    POLL_MS = 50
+
+    def __init__(self, master, status_var=None):
+        self.master = master
+        self.status_var = status_var
+        self.job = None
+
+    @property
+    def busy(self):
+        return self.job is not None
+
+    def submit(self, func, args=(), kwargs=None, name=None,
+               on_done=None, on_cancel=None, on_error=None):
+        ''' start func(*args, **kwargs) in background, return False if busy '''
+        name = name or func.__name__
+        if self.busy:
+            logging.info(f"busy with {self.job['name']}, {name} ignored")
+            return False
+
+        job = {"name": name,
+               "func": func,
+               "args": args,
+               "kwargs": kwargs or {},
+               "on_done": on_done,
+               "on_cancel": on_cancel,
+               "on_error": on_error,
+               "cancelled": threading.Event(),
+               "progress": None,
+               "t0": time.perf_counter(),
+               }
+        job["thread"] = threading.Thread(target=self._run, args=(job,),
+                                         daemon=True)
+        self.job = job
+        logging.info(f"worker start {name}")
+        job["thread"].start()
+        self.master.config(cursor="watch")
+        self._poll()
+        return True
+
+    def cancel(self):
+        ''' result of running job will be discarded,
+        job stops early if it calls check_cancelled '''
+        if not self.busy:
+            return
+        logging.info(f"cancel {self.job['name']}")
+        self.job["cancelled"].set()
+
+    def _run(self, job):
+        _local.job = job
+        try:
+            with npprofile.span(job["name"], "command"):
+                job["result"] = job["func"](*job["args"], **job["kwargs"])
+        except Exception as e:
+            job["error"] = e
+
+    def _serve_main_calls(self):
+        while True:
+            try:
+                call = _main_calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                call["result"] = call["func"](*call["args"], **call["kwargs"])
+            except Exception as e:
+                call["error"] = e
+            call["done"].set()
+
+    def _poll(self):
+        job = self.job
+        self._serve_main_calls()
+        if job["thread"].is_alive():
+            self._show_status(job)
+            self.master.after(self.POLL_MS, self._poll)
+            return
+
+        self.job = None
+        self.master.config(cursor="")
+        self._set_status("")
+        elapsed = time.perf_counter() - job["t0"]
+
+        if job["cancelled"].is_set():
+            logging.info(f"{job['name']} cancelled after {elapsed:.2f}s")
+            if job["on_cancel"]:
+                job["on_cancel"]()
+            return
+        if "error" in job:
+            logging.info(job["error"])  # ignore error (eg. dialog cancel)
+            if job["on_error"]:
+                job["on_error"](job["error"])
+            return
+        logging.info(f"worker done {job['name']} in {elapsed:.2f}s")
+        if job["on_done"]:
+            job["on_done"](job["result"])
+
+    def _show_status(self, job):
+        if job["cancelled"].is_set():  # long steps (one filter call) are not interrupted
+            text = "cancelling,\nresult discarded"
+        elif job["progress"] is not None:
+            text = f"{job['progress']:.0%}"
+        else:
+            text = f"{time.perf_counter() - job['t0']:.0f}s"
+        self._set_status(f"{job['name']}\n{text}")
+
+    def _set_status(self, text):
+        if self.status_var is not None:
+            self.status_var.set(text)
@@ -2,7 +2,10 @@
 import logging
 import sys
 import time
+STARTUP = {"start": time.perf_counter()}  # startup phases, time to first image
 import os
+import inspect
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import tkinter as tk
 import numpy as np
@@ -16,15 +19,26 @@ from skimage_dtype import img_as_ubyte
 import npimage
 import nphistory
 import npfilters
+import npgeometry
+import npmask
 import nphistwin
 import npstatswin
-from npgui import askfloat
+import nprefresh
+import npworker
+import npparams
+import npgui
+import npbatch
+import npmemory
+import npmemwin
+import npprofile
+import npprofwin
+import npcache
+import npthumbwin
 from tkinter import filedialog
-from npfilelist import FileList
-from testing.timeit import timeit
+from npfilelist import FileList, IMAGE_EXTENSIONS, folder_files
+from npprofile import timed
 
-time0 = time.time()
-print("imports done")
+STARTUP["imports"] = time.perf_counter()
 
 '''
 RESOURCES:
@@ -58,10 +72,6 @@ move command functions inside app class? is it possible to decorate them?
 
     underline _File _View ...
 
-    command parameters to history
-
-    command history to text file or iptc?
-
     repeat command
 
     circular selection
@@ -75,9 +85,24 @@ CFG = {
     "hide_histogram": True,
     "hide_toolbar": False,
     "hide_stats": True,
+    "hide_memory": True,
+    "memory_limit_mb": None,  # over limit caches, view levels and history are freed, None - half of RAM
     "histogram_bins": 256,
     "history_steps": 10,     # memory !!!
-    "image_extensions" : [".jpg", ".jpeg", ".png", ".tif", ".tiff", ".gif"],
+    "preview": True,         # tune parameters on displayed view
+    "value_only": False,     # tone filters change hsv value of rgb only
+    "fft_mode": "channels",  # spectrum of each channel or "luminance"
+    "fft_workers": -1,       # fft threads, -1 = all cores
+    "fft_filter_shape": "butterworth",  # or "gaussian"
+    "gaussian_method": "auto",  # "exact", "fft", "box", "pyramid"
+    "rotate_order": 1,       # interpolation: 0 nearest, 1 linear, 3 cubic
+    "resize_method": "auto",  # "area", "bilinear", "lanczos", auto: area down, lanczos up
+    "view_method": "area",   # display downscale, "nearest" is fastest
+    "auto_repeat": False,    # repeat last command on loaded images, next one prefetched
+    "image_extensions" : IMAGE_EXTENSIONS,
+    "thumb_size": 160,       # contact sheet, thumbnails cached in ~/.cache/npyshop
+    "decoded_cache_mb": 1024,  # reopened images not decoded again, 0 - off
+    "decoded_disk_cache": False,  # also raw arrays in ~/.cache/npyshop/decoded, memory mapped
 
 }
 
@@ -91,6 +116,7 @@ def commands_dict():
                 ("Save", "S", save),
                 ("Save as", "s", save_as),
                 ("Save as png", "P", save_as_png),
+                ("Export resized", "x", export_resized),
                 ("Previous", "Left", load_previous),
                 ("Next", "Right", load_next),
                 ("Next", "Up", load_first),
@@ -102,6 +128,7 @@ def commands_dict():
                 ("Undo", "z", undo),
                 ("Redo", "y", redo),
                 ("Original_toggle", "q", toggle_original),
+                ("Cancel running", "Escape", cancel),
 
             ],
         "Image":
@@ -111,12 +138,17 @@ def commands_dict():
                 ("Rotate_270", "R", rotate_270),
                 ("Rotate_180", "u", rotate_180),
                 ("Free Rotate", "f", free_rotate),
+                ("Resize", "Z", resize),
                 ("rgb2gray", "b", rgb2gray),
                 ("FFT toggle", "F", fft_toggle),
             ],
         "Selection":
             [
                 ("Select all", "Control-a", select_all),
+                ("Ellipse selection", "O", select_ellipse),
+                ("Polygon selection", "G", select_polygon),
+                ("Magic wand at mouse", "W", magic_wand),
+                ("Threshold selection", "T", select_threshold),
                 ("Flip", ")", flip),
                 ("Mirror", "(", mirror),
                 ("Gamma", "g", gamma),
@@ -138,10 +170,31 @@ def commands_dict():
                 ("delete", "Delete", delete),
                 ("fill", "Insert", fill),
             ],
+        "Macro":
+            [
+                ("Repeat last", "period", repeat_last),
+                ("Auto repeat toggle", "A", auto_repeat_toggle),
+                ("Record toggle", "K", macro_record_toggle),
+                ("Play", "X", macro_play),
+                ("Next image + play", "V", macro_next_and_play),
+                ("Export batch recipe", "Y", macro_export),
+            ],
+        "FFT":
+            [
+                ("Lowpass", "j", fft_lowpass),
+                ("Highpass", "k", fft_highpass),
+                ("Bandpass", "J", fft_bandpass),
+                ("Notch selection", "N", fft_notch),
+            ],
         "View":
             [
                 ("Histogram", "h", hist_toggle),
                 ("Stats", "t", stats_toggle),
+                ("Contact sheet", "U", contact_sheet),
+                ("Memory", "w", memory_toggle),
+                ("Profile", "Q", profile_toggle),
+                ("Preview toggle", "p", preview_toggle),
+                ("Value only toggle", "v", value_only_toggle),
 #                ("Zoom in", "KP_Add", app.zoom_in),
 #                ("Zoom out", "KP_Subtract", app.zoom_out),
             ],
@@ -181,15 +234,40 @@ def load(fp=None):
     if not fp:
         return
 
-    app.img.load(fp)
+    p = take_prefetch(fp)
+    if p and not p["future"].done():  # wait in worker, gui responsive, cancel works
+        if app.worker.submit(wait_prefetch, (p["future"],), name="load prefetched",
+                             on_done=lambda result: open_image(fp, prefetched(p)),
+                             on_cancel=lambda: open_image(fp, repeat=False),
+                             on_error=lambda e: open_image(fp)):
+            return
+    open_image(fp, prefetched(p) if p and p["future"].done() else None)
+
+
+def open_image(fp, prefetched=None, repeat=True):
+    ''' show loaded image, prefetched: image edited in background,
+    repeat: auto repeat last command on image loaded here '''
+    if prefetched:  # loaded and edited in background
+        app.img = prefetched["img"]
+        app.img.fft_mode = CFG["fft_mode"]
+        app.img.fft_workers = CFG["fft_workers"]
+    else:
+        app.img.load(fp)
     app.filelist = FileList(fp, extensions=CFG["image_extensions"])
     os.chdir(app.img.fpath.parent)
     app.history = nphistory.History(max_length=CFG["history_steps"]) # reset history
-    app.history.original = app.img.arr.copy()
-    app.history.add(app.img.arr, "load")
+    app.history.original = prefetched["original"] if prefetched else app.img.snapshot()
+    app.history.add(app.history.original, "load")
+    if prefetched:
+        app.history.add(app.img.snapshot(), prefetched["step"]["command"])
     app.title(app.img.fpath)
     app.reset()
-    app.histwin.update()
+    app.selection.reset()  # previous image selection does not apply
+    app.refresh("hist", "stats", "memory")
+    if prefetched:
+        prefetch_next()
+    elif CFG["auto_repeat"] and repeat:
+        repeat_last(as_recorded=True)  # same selection as prefetch
 
 
 def load_next():
@@ -222,6 +300,24 @@ def save_as_png():
     app.img.save()
 
 
+@npworker.in_main_thread
+def ask_save_path(**kw):
+    return filedialog.asksaveasfilename(**kw)
+
+
+def export_resized():
+    ''' save resized copy, image is not changed '''
+    app.preview = None
+
+    def export():
+        size = askfloat("Export - longer side (pixels):", initialvalue=2000)
+        fpath = ask_save_path(defaultextension=".jpg")
+        if fpath:
+            app.img.export(fpath, size, method=CFG["resize_method"])
+
+    app.worker.submit(export)
+
+
 def toggle_original():
 
     #    app.img.reset()
@@ -231,13 +327,13 @@ def toggle_original():
 
     if not app.history.toggle_original:
         logging.info("show original")
-        app.img.arr = app.history.original.copy()
+        app.img.restore(app.history.original)
     else:
         logging.info("show last")
-        app.img.arr = app.history.last()['arr'].copy()
+        app.img.restore(app.history.last()['state'])
 
     app.history.toggle_original = not app.history.toggle_original
-    app.update()
+    app.refresh()
 
 #  ------------------------------------------
 #  HISTORY
@@ -248,44 +344,117 @@ def undo():
     logging.info("undo")
     prev = app.history.undo()
     if prev:
-        app.img.arr = prev['arr'].copy()
-        app.update()
-        app.histwin.update()
-        app.statswin.update()
+        app.img.restore(prev['state'])
+        app.refresh()
 
 
 def redo():
     logging.info("redo")
     nex = app.history.redo()
     if nex:
-        app.img.arr = nex['arr'].copy()
-        app.update()
-        app.histwin.update()
-        app.statswin.update()
+        app.img.restore(nex['state'])
+        app.refresh()
+
+
+def cancel():
+    ''' discard result of running command '''
+    app.worker.cancel()
+
+
+def restore_current():
+    ''' return image to current history state (after cancelled command) '''
+    current = app.history.current()
+    if current:
+        app.img.restore(current['state'])
+    app.refresh()
+
+#  ------------------------------------------
+#  PARAMETERS
+#  ------------------------------------------
+
+
+def askfloat(prompt, spatial=False, **kw):
+    ''' command parameter - replayed or asked from user
+    spatial: value in pixels (radius), scaled down in preview '''
+    replay = npparams.replaying()
+    if replay:
+        value = replay.next(kw.get("initialvalue"), spatial=spatial)
+    else:
+        value = ask_parameter(prompt, **kw)
+    recorder = npparams.recording()
+    if recorder:
+        recorder.add(value)
+    return value
+
+
+@npworker.in_main_thread
+def ask_parameter(prompt, from_=None, to=None, **kw):
+    ''' dialog, with slider and preview if enabled (commands run in worker) '''
+    if app.preview is None:
+        return npgui.askfloat(prompt, **kw)
+    return app.preview.askfloat(prompt, from_=from_, to=to, **kw)
 
 #  ------------------------------------------
 #  IMAGE
 #  ------------------------------------------
 
 
+MACRO_COMMANDS = {}  # name: command, commands which can be recorded
+
+
+def recorded(func, *args, **kwargs):
+    ''' run command, return parameters it asked for '''
+    with npparams.Recorder() as recorder:
+        func(*args, **kwargs)
+    return recorder.values
+
+
 def edit_image(func):
     ''' decorator :
-       apply changes, update gui and history '''
+       apply changes in worker thread, then update gui and history '''
     @wraps(func)
     def wrapper(*args, **kwargs):
         logging.info(func.__name__)
-        func(*args, **kwargs)
-        logging.debug(f"edit_image {func.__name__} {args} {kwargs}")
-        app.history.add(app.img.arr,  func.__name__, *args, **kwargs)
-        app.update()
-        app.selection.reset()
+        view_func = getattr(wrapper, "preview", None)  # command on view array
+        if view_func and CFG["preview"]:
+            app.preview = Preview(app, view_func, whole=True)
+        else:
+            app.preview = None
+        selection = selection_box()  # mirror, flip, crop use it
+
+        def done(params):
+            logging.debug(f"edit_image {func.__name__} {args} {kwargs} {params}")
+            app.history.add(app.img.snapshot(),  func.__name__)
+            record_step(func.__name__, params, selection)
+            app.refresh()
+            app.selection.reset()
+
+        app.worker.submit(recorded, (func, *args), kwargs, name=func.__name__,
+                          on_done=done, on_cancel=restore_current)
+    wrapper.apply = func  # run without gui (macro)
+    MACRO_COMMANDS[func.__name__] = wrapper
     return wrapper
 
 
+def rotate_view(view):
+    ''' fast free_rotate preview on displayed view '''
+    f = askfloat("Rotate angle (clockwise)", initialvalue=2., from_=-45, to=45)
+    return npgeometry.rotate(view, -f, order=0)
+
+
 @edit_image
 def free_rotate():
-    f = askfloat("Rotate angle (clockwise)", initialvalue=2.)
-    app.img.free_rotate(-f)  # clockwise
+    f = askfloat("Rotate angle (clockwise)", initialvalue=2., from_=-45, to=45)
+    app.img.free_rotate(-f, order=CFG["rotate_order"])  # clockwise
+
+
+free_rotate.preview = rotate_view
+
+
+@edit_image
+def resize():
+    f = askfloat("Resize (% of size):", initialvalue=50, from_=1, to=200)
+    app.img.resize(scale=f / 100, method=CFG["resize_method"])
 
 
 @edit_image
@@ -313,6 +482,37 @@ def fft_toggle():
     app.img.fft_toggle()
 
 
+@edit_image
+def fft_lowpass():
+    f = askfloat("lowpass cutoff (pixels from fft center):", initialvalue=50)
+    app.img.fft_filter("lowpass", f, shape=CFG["fft_filter_shape"])
+
+
+@edit_image
+def fft_highpass():
+    f = askfloat("highpass cutoff (pixels from fft center):", initialvalue=5)
+    app.img.fft_filter("highpass", f, shape=CFG["fft_filter_shape"])
+
+
+@edit_image
+def fft_bandpass():
+    low = askfloat("bandpass low cutoff (pixels from fft center):", initialvalue=5)
+    high = askfloat("bandpass high cutoff (pixels from fft center):", initialvalue=50)
+    app.img.fft_filter("bandpass", low, high, shape=CFG["fft_filter_shape"])
+
+
+@edit_image
+def fft_notch():
+    ''' remove selected peak of fft display and its symmetric peak '''
+    rows, cols = app.selection.slice()[:2]
+    if rows.stop - rows.start >= app.img.height:  # whole image selected
+        logging.info("select peak in fft display first")
+        return
+    center = ((rows.start + rows.stop) / 2, (cols.start + cols.stop) / 2)
+    radius = max(rows.stop - rows.start, cols.stop - cols.start) / 2
+    app.img.fft_notch([center], radius)
+
+
 #  ------------------------------------------
 #  SELECTION
 #  ------------------------------------------
@@ -323,155 +523,427 @@ def select_all():
 
 def edit_selected(func):
     ''' decorator :
-    load selection, ly changes, save to image, update gui and history '''
+    load selection, apply changes in worker thread,
+    save to image, update gui and history '''
+    def apply(*args, **kwargs):
+        ''' edit selection of image, runs in worker thread '''
+        selection = app.img.selection  # as when started, gui may change it
+        y = app.img.get_selection(selection)
+
+        # write result directly to image, no copies of selection
+        in_place = ("out" in inspect.signature(func).parameters
+                    and y.dtype.kind == 'f' and y.flags.writeable
+                    and selection[1] is None)  # masked result is blended
+        if in_place:
+            kwargs = {**kwargs, "out": y}
+
+        with npprofile.span(func.__name__, "filter"):
+            npprofile.count("pixels", y.shape[0] * y.shape[1])
+            result = func(y, *args, **kwargs)
+        npworker.check_cancelled()  # do not write discarded result
+        if result is y:
+            app.img.changed()
+        elif result is not None:
+            app.img.set_selection(result, selection)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        y = app.img.get_selection()
-        try:
-            y = func(y, *args, **kwargs)
-            app.history.add(app.img.arr,  func.__name__)
-        except Exception as e:
-            logging.info(e) # ignore error (eg. dialog cancel)
-            return
-        app.img.set_selection(y)
-        app.update()
-        app.histwin.update()
-        app.statswin.update()
-#        app.history.add(app.img.arr,  func.__name__)
-        logging.info("added to history")
+        app.preview = Preview(app, func) if CFG["preview"] else None
+        selection = selection_box()
+
+        def done(params):
+            app.history.add(app.img.snapshot(),  func.__name__)
+            record_step(func.__name__, params, selection)
+            app.refresh()
+            logging.info("added to history")
+
+        def failed(e):
+            if not isinstance(e, npgui.dialogException):
+                restore_current()  # selection may be partly written
+
+        app.worker.submit(recorded, (apply, *args), kwargs, name=func.__name__,
+                          on_done=done, on_cancel=restore_current, on_error=failed)
+    wrapper.apply = apply  # run without gui (macro)
+    MACRO_COMMANDS[func.__name__] = wrapper
     return wrapper
 
 
-@edit_selected
-def invert(y):
-    return npfilters.invert(y)
+def selection_box():
+    ''' selected rectangle [row0, row1, col0, col1], None if whole image,
+    mask is recorded as its box '''
+    if app.img.selected_all():
+        return None
+    rows, cols = (s.indices(n)[:2] for s, n in zip(app.img.slice[:2], app.img.arr.shape[:2]))
+    return [*rows, *cols]
 
 
-@edit_selected
-def mirror(y):
-    return npfilters.mirror(y)
+def tone_options(y):
+    ''' value_only option of tone filters,
+    value of whole image comes from npImage cache (shared with hsv) '''
+    options = {"value_only": CFG["value_only"]}
+    img = app.img
+    if (CFG["value_only"] and img.color_model == 'rgb' and img.selected_all()
+            and y.shape == img.arr.shape and np.may_share_memory(y, img.arr)):
+        options["value"] = img.value()
+    return options
 
 
 @edit_selected
-def flip(y):
-    return npfilters.flip(y)
+def invert(y, out=None):
+    return npfilters.invert(y, **tone_options(y), out=out)
+
+
+@edit_image
+def mirror():
+    app.img.mirror()
+
+
+@edit_image
+def flip():
+    app.img.flip()
 
 
 @edit_selected
-def contrast(y):
-    f = askfloat("contrast", initialvalue=1.3)
-    return npfilters.contrast(y, f)
+def contrast(y, out=None):
+    f = askfloat("contrast", initialvalue=1.3, from_=0, to=3)
+    return npfilters.contrast(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def multiply(y):
-    f = askfloat("Multiply", initialvalue=1.3)
-    return npfilters.multiply(y, f)
+def multiply(y, out=None):
+    f = askfloat("Multiply", initialvalue=1.3, from_=0, to=3)
+    return npfilters.multiply(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def add(y):
-    f = askfloat("Add", initialvalue=.2)
+def add(y, out=None):
+    f = askfloat("Add", initialvalue=.2, from_=-1, to=1)
     if f is not None:
-        return npfilters.add(y, f)
+        return npfilters.add(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def normalize(y):
-    return npfilters.normalize(y)
+def normalize(y, out=None):
+    return npfilters.normalize(y, **tone_options(y), out=out)
 
 
 @edit_selected
-def adaptive_equalize(y):
-    f = askfloat("adaptive_equalize clip limit", initialvalue=.02)
-    return npfilters.adaptive_equalize(y, clip_limit=f)
+def adaptive_equalize(y, out=None):
+    f = askfloat("adaptive_equalize clip limit", initialvalue=.02, from_=.001, to=.1)
+    return npfilters.adaptive_equalize(y, clip_limit=f, **tone_options(y), out=out)
 
 
 @edit_selected
-def equalize(y):
-    return npfilters.equalize(y)
+def equalize(y, out=None):
+    return npfilters.equalize(y, **tone_options(y), out=out)
 
 
 @edit_selected
-def fill(y):
-    f = askfloat("Fill with:", initialvalue=1)
-    return npfilters.fill(y, f)
+def fill(y, out=None):
+    f = askfloat("Fill with:", initialvalue=1, from_=0, to=1)
+    return npfilters.fill(y, f, out=out)
 
 
 @edit_selected
-def delete(y):
+def delete(y, out=None):
     if app.img.fft is not None:
         logging.info(app.selection.slice())
-        app.img.fft[app.selection.slice()] = 0
-    return npfilters.fill(y, 0)
+        app.img.fft_delete(app.selection.slice())
+    return npfilters.fill(y, 0, out=out)
 
 
 @edit_selected
-def unsharp_mask(y):
-    r = askfloat("unsharp_mask - radius:", initialvalue=.5)
-    a = askfloat("unsharp_mask - amount:", initialvalue=0.2)
-    return npfilters.unsharp_mask(y, radius=r, amount=a)
+def unsharp_mask(y, out=None):
+    r = askfloat("unsharp_mask - radius:", initialvalue=.5, from_=.1, to=20, spatial=True)
+    a = askfloat("unsharp_mask - amount:", initialvalue=0.2, from_=0, to=2)
+    return npfilters.unsharp_mask(y, radius=r, amount=a, method=CFG["gaussian_method"], out=out)
 
 
 @edit_selected
-def blur(y):
-    f = askfloat("gaussian blur radius:", initialvalue=1)
-    return npfilters.blur(y, f)
+def blur(y, out=None):
+    f = askfloat("gaussian blur radius:", initialvalue=1, from_=0, to=30, spatial=True)
+    return npfilters.blur(y, f, method=CFG["gaussian_method"], out=out)
 
 
 @edit_selected
-def highpass(y):
-    f = askfloat("subtrack_background", initialvalue=20)
-    return npfilters.highpass(y, f)
+def highpass(y, out=None):
+    f = askfloat("subtrack_background", initialvalue=20, from_=1, to=100, spatial=True)
+    return npfilters.high_pass(y, f, method=CFG["gaussian_method"], out=out)
 
 
 @edit_selected
-def sigmoid(y):
-    f = askfloat("Increase contrast with S-shape curve: (5-10)", initialvalue=5)
-    return npfilters.sigmoid(y, gain=f)
+def sigmoid(y, out=None):
+    f = askfloat("Increase contrast with S-shape curve: (5-10)", initialvalue=5, from_=0, to=20)
+    return npfilters.sigmoid(y, gain=f, **tone_options(y), out=out)
 
 
 @edit_selected
-def gamma(y):
-    f = askfloat("Set Gamma:", initialvalue=.8)
-    return npfilters.gamma(y, f)
+def gamma(y, out=None):
+    f = askfloat("Set Gamma:", initialvalue=.8, from_=.1, to=3)
+    return npfilters.gamma(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def clip_high(y):
-    f = askfloat("Cut high:", initialvalue=.9)
-    return npfilters.clip_high(y, f)
+def clip_high(y, out=None):
+    f = askfloat("Cut high:", initialvalue=.9, from_=0, to=1)
+    return npfilters.clip_high(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def clip_low(y):
-    f = askfloat("Cut low:", initialvalue=.1)
-    return npfilters.clip_low(y, f)
+def clip_low(y, out=None):
+    f = askfloat("Cut low:", initialvalue=.1, from_=0, to=1)
+    return npfilters.clip_low(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def tres_high(y):
-    f = askfloat("treshold high", initialvalue=.9)
-    return npfilters.tres_high(y, f)
+def tres_high(y, out=None):
+    f = askfloat("treshold high", initialvalue=.9, from_=0, to=1)
+    return npfilters.tres_high(y, f, **tone_options(y), out=out)
 
 
 @edit_selected
-def tres_low(y):
-    f = askfloat("treshold low", initialvalue=.1)
-    return npfilters.tres_low(y, f)
+def tres_low(y, out=None):
+    f = askfloat("treshold low", initialvalue=.1, from_=0, to=1)
+    return npfilters.tres_low(y, f, **tone_options(y), out=out)
 
 
+@edit_image
 def crop():
     logging.info(f"{app.selection} crop")
-    app.img.crop(*app.selection.geometry)
-    app.update()
-    app.history.add(app.img.arr, "crop")
-    app.selection.reset()
+    app.img.crop()
+
 
+def select_ellipse():
+    ''' ellipse inscribed in selected rectangle '''
+    app.selection.ellipse()
 
-def circular_mask():
-    logging.info("zoom in")
-    app.selection.make_cirk_mask()
+
+def select_polygon():
+    ''' polygon of points added by shift + click '''
+    app.selection.polygon()
+
+
+def magic_wand():
+    ''' pixels connected to pixel under mouse, similar in luminance,
+    searched in selected rectangle '''
+    seed = get_mouse()
+    app.preview = None
+    f = askfloat("Magic wand tolerance", initialvalue=.1, from_=0, to=1)
+    app.selection.magic_wand(seed, f)
+
+
+def select_threshold():
+    ''' pixels of luminance in range, searched in selected rectangle '''
+    app.preview = None
+    low = askfloat("Threshold selection - low", initialvalue=.5, from_=0, to=1)
+    high = askfloat("Threshold selection - high", initialvalue=1, from_=0, to=1)
+    app.selection.threshold(low, high)
+
+#  ------------------------------------------
+#  MACRO
+#  ------------------------------------------
+
+
+def batch_step(op, *args, **kwargs):
+    return {"op": op, "args": list(args), "kwargs": kwargs}
+
+
+def batch_steps_dict():
+    ''' command name: (parameters -> npbatch recipe step),
+    settings are taken when command is recorded '''
+    v = {"value_only": CFG["value_only"]}
+    m = {"method": CFG["gaussian_method"]}
+    shape = {"shape": CFG["fft_filter_shape"]}
+    return {
+        "free_rotate": lambda f: batch_step("free_rotate", -f, order=CFG["rotate_order"]),
+        "resize": lambda f: batch_step("resize", scale=f / 100, method=CFG["resize_method"]),
+        "rotate_90": lambda: batch_step("rotate", 1),
+        "rotate_270": lambda: batch_step("rotate", 3),
+        "rotate_180": lambda: batch_step("rotate", 2),
+        "rgb2gray": lambda: batch_step("rgb2gray"),
+        "mirror": lambda: batch_step("mirror"),
+        "flip": lambda: batch_step("flip"),
+        "crop": lambda: batch_step("crop"),  # to recorded selection
+        "fft_lowpass": lambda f: batch_step("fft_filter", "lowpass", f, **shape),
+        "fft_highpass": lambda f: batch_step("fft_filter", "highpass", f, **shape),
+        "fft_bandpass": lambda lo, hi: batch_step("fft_filter", "bandpass", lo, hi, **shape),
+        "invert": lambda: batch_step("invert", **v),
+        "contrast": lambda f: batch_step("contrast", f, **v),
+        "multiply": lambda f: batch_step("multiply", f, **v),
+        "add": lambda f: batch_step("add", f, **v),
+        "normalize": lambda: batch_step("normalize", **v),
+        "adaptive_equalize": lambda f: batch_step("adaptive_equalize", clip_limit=f, **v),
+        "equalize": lambda: batch_step("equalize", **v),
+        "fill": lambda f: batch_step("fill", f),
+        "delete": lambda: batch_step("fill", 0),
+        "unsharp_mask": lambda r, a: batch_step("unsharp_mask", r, a, **m),
+        "blur": lambda f: batch_step("blur", f, **m),
+        "highpass": lambda f: batch_step("high_pass", f, **m),
+        "sigmoid": lambda f: batch_step("sigmoid", gain=f, **v),
+        "gamma": lambda f: batch_step("gamma", f, **v),
+        "clip_high": lambda f: batch_step("clip_high", f, **v),
+        "clip_low": lambda f: batch_step("clip_low", f, **v),
+        "tres_high": lambda f: batch_step("tres_high", f, **v),
+        "tres_low": lambda f: batch_step("tres_low", f, **v),
+    }
+
+
+def recipe_step(step):
+    ''' npbatch step of recorded command, with its selection '''
+    if step["selection"]:
+        return {**step["batch"], "selection": step["selection"]}
+    return step["batch"]
+
+
+def record_step(name, params, selection=None):
+    ''' remember finished command (repeat), add it to macro if recording '''
+    to_batch = batch_steps_dict().get(name)
+    step = {"command": name,
+            "params": params,
+            "selection": selection,
+            "batch": to_batch(*params) if to_batch else None,  # not in batch
+            }
+    app.last_step = step
+    if app.recording:
+        app.macro.append(step)
+        logging.info(f"recorded {step}")
+    prefetch_next()
+
+
+def macro_record_toggle():
+    ''' start new macro / stop recording '''
+    app.recording = not app.recording
+    if app.recording:
+        app.macro = []
+    logging.info(f"macro recording {app.recording}, {len(app.macro)} steps")
+
+
+def play_steps(steps, name, keep_selection=False, after=None):
+    ''' apply recorded commands to current image in worker, one history step,
+    keep_selection: use current selection, not the recorded ones '''
+    app.preview = None
+
+    def play():
+        for i, step in enumerate(steps):
+            npworker.check_cancelled()
+            npworker.report_progress(i / len(steps))
+            if not keep_selection:
+                sel = step["selection"]
+                app.img.slice = np.s_[:, :, ...] if sel is None else np.s_[sel[0]:sel[1], sel[2]:sel[3], ...]
+                app.img.mask = None
+            with npparams.Replay(step["params"]):
+                MACRO_COMMANDS[step["command"]].apply()
+
+    def done(result):
+        app.history.add(app.img.snapshot(), name)
+        if after:
+            after()
+        app.selection.reset()
+        app.refresh()
+
+    def stopped(e=None):
+        if not isinstance(e, npgui.dialogException):
+            restore_current()
+        app.selection.reset()
+
+    app.worker.submit(play, name=name, on_done=done,
+                      on_cancel=stopped, on_error=stopped)
+
+
+def macro_play():
+    if not app.macro:
+        logging.info("no macro recorded")
+        return
+    play_steps(list(app.macro), "macro")
+
+
+def repeat_last(as_recorded=False):
+    ''' apply last command with its parameters to current selection,
+    as_recorded: to its recorded selection (auto repeat, as prefetch does) '''
+    step = app.last_step
+    if not step:
+        logging.info("nothing to repeat")
+        return
+    selection = step["selection"] if as_recorded else selection_box()
+    play_steps([step], step["command"], keep_selection=not as_recorded,
+               after=lambda: record_step(step["command"], step["params"], selection))
+
+
+def auto_repeat_toggle():
+    CFG["auto_repeat"] = not CFG["auto_repeat"]
+    logging.info(f"auto repeat {CFG['auto_repeat']}")
+    prefetch_next()
+
+
+def prefetch_image(fpath, batch):
+    ''' load image and apply recipe step, runs in background thread '''
+    img = npimage.npImage(img_path=fpath)
+    original = img.snapshot()
+    npbatch.apply_step(img, batch)
+    return img, original
+
+
+def prefetch_next():
+    ''' auto repeat: edit next image of folder in background '''
+    step, fpath = app.last_step, app.filelist.next
+    if not (CFG["auto_repeat"] and step and step["batch"] and fpath):
+        return
+    if app.prefetch and app.prefetch["path"] == fpath and app.prefetch["step"] is step:
+        return  # already running
+    if app.prefetch:
+        app.prefetch["future"].cancel()  # stale, if not started yet
+    logging.info(f"prefetch {fpath} {step['command']}")
+    app.prefetch = {"path": fpath, "step": step,
+                    "future": app.prefetcher.submit(prefetch_image, fpath, recipe_step(step))}
+
+
+def take_prefetch(fpath):
+    ''' prefetch of file edited by current last command, running or done,
+    stale prefetch is cancelled '''
+    p, app.prefetch = app.prefetch, None
+    if not p:
+        return None
+    if not (CFG["auto_repeat"] and Path(p["path"]) == Path(fpath)
+            and p["step"] is app.last_step):
+        p["future"].cancel()  # stale, if not started yet
+        return None
+    return p
+
+
+def wait_prefetch(future):
+    ''' worker job: wait for running prefetch, cancel stops waiting '''
+    while not future.done():
+        npworker.check_cancelled()
+        wait([future], timeout=.1)
+
+
+def prefetched(p):
+    ''' image of finished prefetch, None if it failed '''
+    try:
+        img, original = p["future"].result()
+    except Exception as e:
+        logging.info(f"prefetch failed {e}")
+        return None
+    return {"img": img, "original": original, "step": p["step"]}
+
+
+def macro_next_and_play():
+    load_next()
+    macro_play()
+
+
+def macro_export():
+    ''' save macro as npbatch recipe (json) '''
+    missing = [s["command"] for s in app.macro if s["batch"] is None]
+    if not app.macro or missing:
+        logging.info(f"nothing to export or not supported in batch: {missing}")
+        return
+    recipe = [recipe_step(s) for s in app.macro]
+    fpath = filedialog.asksaveasfilename(defaultextension=".json",
+                                         filetypes=[("recipe", "*.json")])
+    if fpath:
+        npbatch.save_recipe(recipe, fpath)
+        logging.info(f"recipe saved {fpath}: {[npbatch.format_step(s) for s in recipe]}")
 
 #  ------------------------------------------
 #  GUI FUNCTIONS
@@ -479,6 +951,25 @@ def circular_mask():
 
 
 
+def view_image(view):
+    ''' displayed array -> 8bit PIL image '''
+    return Image.fromarray(img_as_ubyte(np.clip(view, 0, 1)))
+
+
+def startup_report():
+    ''' time to first image by phases, slowest operations (npprofile) '''
+    app.update_idletasks()  # image on screen
+    STARTUP["first image"] = time.perf_counter()
+    phases = list(STARTUP.items())
+    report = ", ".join(f"{name} {t - t_prev:.2f}s"
+                       for (_, t_prev), (name, t) in zip(phases, phases[1:]))
+    slowest = ", ".join(f"{name} {st['total_ms'] / 1e3:.2f}s"
+                        for name, st in list(npprofile.summary().items())[:3])
+    report = f"startup {phases[-1][1] - phases[0][1]:.2f}s: {report} (slowest: {slowest})"
+    logging.info(report)
+    print(report)
+
+
 def get_mouse():
     ''' get mouse position relative to canvas top left corner '''
     x = int(app.canvas.winfo_pointerx() - app.canvas.winfo_rootx())
@@ -487,11 +978,64 @@ def get_mouse():
 
 
 def hist_toggle():
-    toggle_win(app.histwin)
+    toggle_win(app.info_win("hist"))
 
 
 def stats_toggle():
-    toggle_win(app.statswin)
+    toggle_win(app.info_win("stats"))
+
+
+def memory_toggle():
+    toggle_win(app.info_win("memory"))
+
+
+def profile_toggle():
+    toggle_win(app.info_win("profile"))
+
+
+def contact_sheet():
+    ''' thumbnails of images in folder, click opens image '''
+    if app.img.fpath is None:
+        return
+    if app.sheetwin is None:  # created on first use
+        app.sheetwin = npthumbwin.sheetWin(master=app, on_open=open_from_sheet,
+                                           size=CFG["thumb_size"])
+    app.sheetwin.show(folder_files(app.img.fpath.parent, CFG["image_extensions"]))
+
+
+def open_from_sheet(fpath):
+    def open_image():
+        load(fpath)
+    run_command(open_image)
+
+
+def preview_toggle():
+    CFG["preview"] = not CFG["preview"]
+    logging.info(f"preview {CFG['preview']}")
+
+
+def value_only_toggle():
+    ''' tone filters on rgb: change value only (keep hue, saturation) '''
+    CFG["value_only"] = not CFG["value_only"]
+    logging.info(f"value only {CFG['value_only']}")
+
+
+def run_command(command):
+    ''' run command, ignore it while worker is busy
+    (it would work with image being changed) '''
+    if app.worker.busy and command not in (cancel, hist_toggle, stats_toggle,
+                                           memory_toggle, profile_toggle, preview_toggle,
+                                           value_only_toggle):
+        logging.info(f"busy, {command.__name__} ignored")
+        return
+    command()
+
+
+def escape():
+    if app.worker.busy:
+        cancel()
+    else:
+        select_all()
 
 
 def keyPressed(event):
@@ -500,7 +1044,7 @@ def keyPressed(event):
     for menu, items in commands_dict().items():
         for name, key, command in items:
             if event.keysym == key:
-                command()
+                run_command(command)
 
 
 def toggle_win(win):
@@ -530,23 +1074,45 @@ class App(tk.Toplevel):
 
         self.master = master
         self.geometry("900x810")
+        if CFG["decoded_cache_mb"]:
+            npimage.npImage.decoded_cache = npcache.DecodedCache(
+                max_bytes=CFG["decoded_cache_mb"] * 2 ** 20,
+                disk_dir=npcache.CACHE_DIR if CFG["decoded_disk_cache"] else None)
         self.img = npimage.npImage(img_path=img_path, img_arr=img_arr, fft=fft)
+        self.img.fft_mode = CFG["fft_mode"]
+        self.img.fft_workers = CFG["fft_workers"]
         self.filelist = FileList(img_path, extensions=CFG["image_extensions"])
         self.zoom_var = tk.StringVar()
         self.zoom = 1
         self.ofset = [0, 0]
 
         self.selection = Selection(master=self)
+        self.preview = None
+        self.macro = []  # recorded steps
+        self.recording = False
+        self.last_step = None  # last command for repeat
+        self.prefetch = None  # next image edited in background (auto repeat)
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.sheetwin = None  # contact sheet
         self.history = nphistory.History(max_length=CFG["history_steps"])
-        self.histwin = nphistwin.histWin(
-            master=self, hide=CFG["hide_histogram"])
-        self.statswin = npstatswin.statsWin(
-            master=self, hide=CFG["hide_stats"])
-
-        self.history.add(self.img.arr, "orig")
-        self.history.original = self.img.arr.copy()
+        self.histwin = self.statswin = self.memwin = self.profilewin = None
+        for name, hide in (("hist", CFG["hide_histogram"]), ("stats", CFG["hide_stats"]),
+                           ("memory", CFG["hide_memory"])):
+            if not hide:  # hidden ones are created when shown first (startup time)
+                self.info_win(name, hide=False)
+        self._memory_init()
+
+        self.refresher = nprefresh.RefreshScheduler(master=self)
+        self.refresher.register("image", self.update)
+        self.refresher.register("hist", lambda: self.histwin and self.histwin.update())
+        self.refresher.register("stats", lambda: self.statswin and self.statswin.update())
+        self.refresher.register("memory", lambda: self.memwin and self.memwin.update())
+
+        self.history.add(self.img.snapshot(), "orig")
+        self.history.original = self.img.snapshot()
 
         self._gui_toolbar_init()
+        self.worker = npworker.Worker(master=self, status_var=self.status_var)
 
         self._gui_menu_init()
         self._gui_canvas_init()
@@ -563,12 +1129,54 @@ class App(tk.Toplevel):
             tkmenu[submenu] = tk.Menu(self.menubar, tearoff=0)
             for name, key, command in items:
                 tkmenu[submenu].add_command(label=f"{name}   {key}",
-                                                  command=command)
+                                  command=lambda c=command: run_command(c))
             self.menubar.add_cascade(label=submenu, menu=tkmenu[submenu])
             self.config(menu=self.menubar)
 
 
 
+    def info_win(self, name, hide=True):
+        ''' info window, created on first use '''
+        attr, win_class = {"hist": ("histwin", nphistwin.histWin),
+                           "stats": ("statswin", npstatswin.statsWin),
+                           "memory": ("memwin", npmemwin.memoryWin),
+                           "profile": ("profilewin", npprofwin.profileWin),
+                           }[name]
+        if getattr(self, attr) is None:
+            setattr(self, attr, win_class(master=self, hide=hide))
+        return getattr(self, attr)
+
+    def _memory_init(self):
+        ''' report arrays to memory accountant, evict in order over limit:
+        decoded cache, prefetched image, view levels, history (spill to disk) '''
+        acc = npmemory.accountant
+        if CFG["memory_limit_mb"]:
+            acc.limit = CFG["memory_limit_mb"] * 2 ** 20
+        acc.register("image", lambda: self.img.arrays())
+        acc.register("views", lambda: self.img.view_arrays(),
+                     lambda n: self.img.drop_views(n), priority=2)
+        acc.register("history", lambda: self.history.arrays(),
+                     lambda n: self.history.spill(n, keep=self.img.arrays()), priority=3)
+        cache = npimage.npImage.decoded_cache
+        if cache:
+            acc.register("decoded", cache.arrays, cache.evict, priority=0)
+        acc.register("prefetch", self._prefetch_arrays, self._prefetch_drop, priority=1)
+
+    def _prefetch_arrays(self):
+        p = self.prefetch
+        if not (p and p["future"].done() and not p["future"].cancelled()
+                and p["future"].exception() is None):
+            return []
+        img, original = p["future"].result()
+        return [*img.arrays(), original["base"]]
+
+    def _prefetch_drop(self, nbytes):
+        freed = sum(npmemory.owner(a).nbytes for a in self._prefetch_arrays())
+        if self.prefetch:
+            self.prefetch["future"].cancel()
+            self.prefetch = None
+        return freed
+
     def _gui_toolbar_init(self):
 
         backgroundColour = "white"
@@ -589,9 +1197,15 @@ class App(tk.Toplevel):
         for i, b in enumerate(buttons_dict()):
             button = tk.Button(self.toolbar, text=b[0], font=('Arial Narrow', '10'),
                                background=backgroundColour, width=buttonWidth,
-                               height=buttonHeight, command=b[1])
+                               height=buttonHeight,
+                               command=lambda c=b[1]: run_command(c))
             button.pack(side="top")
 
+        self.status_var = tk.StringVar()
+        self.status_label = tk.Label(
+            self.toolbar, width=buttonWidth, textvariable=self.status_var)
+        self.status_label.pack(side="top")
+
         self.toolbar.pack(side="left")
 
 
@@ -600,7 +1214,7 @@ class App(tk.Toplevel):
         self.protocol("WM_DELETE_WINDOW", self._quit)
 
         self.bind("<Key>", lambda event: keyPressed(event))
-        self.bind("<Escape>", lambda event: select_all())
+        self.bind("<Escape>", lambda event: escape())
         self.bind("<MouseWheel>", self._mouse_wheel)  # windows
         self.bind("<Button-4>", self._mouse_wheel)  # linux
         self.bind("<Button-5>", self._mouse_wheel)  # linux
@@ -610,6 +1224,7 @@ class App(tk.Toplevel):
         self.bind("<Control-Right>", lambda event: self.selection.set_border(b="E"))
         self.bind("<Control-Up>", lambda event: self.selection.set_border(b="N"))
         self.bind("<Control-Down>", lambda event: self.selection.set_border(b="S"))
+        self.bind("<Shift-Button-1>", lambda event: self.selection.add_point())
 
     def _gui_canvas_init(self):
         width = 800
@@ -617,25 +1232,31 @@ class App(tk.Toplevel):
         self.canvas = tk.Canvas(self, width=width,
                                 height=height, background="gray")
         self.canvas.pack(fill=tk.BOTH, expand=tk.YES)
+        self.image = None
         self.zoom = max(1, min(self.img.width // 2 **
                                9, self.img.height // 2**9))
         self.ofset = [0, 0]  # position of image NW corner relative to canvas
 
-#    @timeit
-    def _make_image_view(self):
+    def view_array(self):
+        ''' displayed (downsampled) image array '''
+        return self.img.view(self.zoom, method=CFG["view_method"])
+
+#    @timed
+    def _make_image_view(self, view=None):
 
         logging.info(self.img.arr.shape)
         logging.info(self.zoom)
 
-        view = self.img.arr[::self.zoom, ::self.zoom, ...]
+        if view is None:
+            view = self.view_array()
         self.view_shape = view.shape[:2]
 
         view = self._apply_view_filters(view)
-        view = Image.fromarray(img_as_ubyte(np.clip(view,0,1)))
+        view = view_image(view)
 
         self.view = ImageTk.PhotoImage(view, master=self)
 
-#    @timeit
+#    @timed
     def _apply_view_filters(self, view):
 
         gamma
@@ -646,24 +1267,33 @@ class App(tk.Toplevel):
         return view
 
 
-    @timeit
-    def draw(self):
-        ''' draw new image '''
-        self._make_image_view()
+    @timed
+    def draw(self, view=None):
+        ''' draw new image, or given view array (preview) '''
+        self._make_image_view(view)
         logging.info(f"ofset {self.ofset}")
+        if self.image is not None:
+            self.canvas.delete(self.image)  # do not stack old views
         self.image = self.canvas.create_image(self.ofset[0], self.ofset[1],
                                               anchor="nw", image=self.view)
+        self.canvas.tag_lower(self.image)  # keep selection rectangle on top
 
     def reset(self):
         self.zoom = max(1, self.img.width//800,  self.img.height//800)
         self.ofset = [0, 0]
         # logging.info(f"initial zoom set: {self.zoom}")
-        self.update()
+        self.refresh("image")
+
+    def refresh(self, *views):
+        ''' schedule redraw of views ("image", "hist", "stats"),
+        all views if none given; repeated requests are coalesced '''
+        self.refresher.request(*views)
 
-    @timeit
+    @timed
     def update(self):
         ''' update image '''
         self.draw()
+        npmemory.accountant.check()
         self.title(self.img.properties())
 #        self.histwin.update()
 #        self.statswin.update()
@@ -685,6 +1315,8 @@ class App(tk.Toplevel):
 
     def _mouse_wheel(self, event):
         """ Zoom with mouse wheel """
+        if self.worker.busy:  # zoom resets selection of running job
+            return
         x = self.canvas.canvasx(event.x)  # get event coords
         y = self.canvas.canvasy(event.y)
         if event.num == 4 or event.delta == +120:
@@ -732,7 +1364,7 @@ class App(tk.Toplevel):
             self.ofset = [c * self.zoom / old_zoom for c in self.ofset]
 
     #        app.ofset = [x, y]
-            self.update()
+            self.refresh("image")
             self.selection.reset()
 
 
@@ -756,7 +1388,7 @@ class App(tk.Toplevel):
             mofset {self.ofset} zoom {self.zoom} \
             zoom step {self.zoom_step()} magnif_change {magnif_change}")
 
-            self.update()
+            self.refresh("image")
             self.selection.reset()
 
 
@@ -780,18 +1412,26 @@ class Selection:
         self.master = master
         self.geometry = [0, 0, 0, 0]
         self.rect = None
-        self.mask = None
-        self.cirk_mode = False
+        self.mask = None  # npmask.Mask, selection is its box
+        self.points = []  # polygon vertices (canvas)
+        self.outline = None
 
     def slice(self):
         ''' recalculate selection by zoom '''
-        x0, y0, x1, y1 = [app.zoom * c for c in self.geometry]
-        slice = np.s_[y0:y1, x0:x1, ...]
+        if self.mask is not None:
+            slice = self.mask.slice
+        else:
+            x0, y0, x1, y1 = [app.zoom * c for c in self.geometry]
+            slice = np.s_[y0:y1, x0:x1, ...]
         app.img.slice = slice
+        app.img.mask = self.mask
 
         return slice
 
     def set_border(self, b="", *args, **kwargs):
+        if app.worker.busy:  # running job edits current selection
+            logging.info("busy, selection not changed")
+            return
         if "N" in b:
             self.geometry[1] = list(get_mouse())[1]
         if "E" in b:
@@ -800,15 +1440,18 @@ class Selection:
             self.geometry[3] = list(get_mouse())[1]
         if "W" in b:
             self.geometry[0] = list(get_mouse())[0]
+        self.mask = None
         self.draw()
 
     def draw(self):
         self._validate_selection()
         app.canvas.delete(self.rect)
-        self.rect = app.canvas.create_rectangle(self.geometry, outline='red')
+        app.canvas.delete(self.outline)
+        dash = () if self.mask is None else (4, 4)  # box of mask
+        self.rect = app.canvas.create_rectangle(self.geometry, outline='red', dash=dash)
+        if len(self.points) > 1:
+            self.outline = app.canvas.create_line(self.points, fill='red')
         self.slice()
-        if self.cirk_mode:
-            self.make_cirk_mask()
 
     def _validate_selection(self):
 
@@ -828,6 +1471,8 @@ class Selection:
         print(f"selection area {self.area} pixels")
 
     def reset(self):
+        self.mask = None
+        self.points = []
         self.select_all()
         self.draw()
 
@@ -835,19 +1480,120 @@ class Selection:
         self.geometry = [0, 0, app.img.width * app.zoom,
                          app.img.height * app.zoom]
 
-    def make_cirk_mask(self):
-        x0, y0, x1, y1 = self.geometry
-        b, a = (x1+x0)/2, (y1+y0)/2
-        nx, ny = app.img.arr.shape[:2]
+    def box(self):
+        ''' selected rectangle in image, explicit rows, cols slices '''
+        m = npmask.Mask.box(app.img.arr.shape,
+                            *[app.zoom * c for c in self.geometry])
+        return m.rows, m.cols
 
-        y, x = np.ogrid[-a:nx-a, -b:ny-b]
-        radius = x0 - b
-        mask = x*x + y*y <= radius*radius
+    def set_mask(self, mask):
+        ''' select mask, geometry becomes its bounding box '''
+        if mask is None:
+            logging.info("empty selection, not changed")
+            return
+        logging.info(mask)
+        self.mask = mask
+        self.points = []
+        z = app.zoom  # canvas pixels (int), box covers the mask
+        self.geometry = [mask.cols.start // z, mask.rows.start // z,
+                         -(-mask.cols.stop // z), -(-mask.rows.stop // z)]
+        self.draw()
 
-        return mask
+    def ellipse(self):
+        self.set_mask(npmask.Mask.ellipse(app.img.arr.shape,
+                                          *[app.zoom * c for c in self.geometry]))
+
+    def add_point(self):
+        if app.worker.busy:
+            return
+        self.points.append(get_mouse())
+        self.draw()
+
+    def polygon(self):
+        points = [(app.zoom * x, app.zoom * y) for x, y in self.points]
+        self.set_mask(npmask.Mask.polygon(app.img.arr.shape, points))
+
+    def magic_wand(self, seed, tolerance):
+        rows, cols = self.box()
+        lum = app.img.luminance()[rows, cols]  # cached until pixels change
+        seed = [app.zoom * c for c in seed]
+        self.set_mask(npmask.Mask.magic_wand(lum, rows, cols, seed, tolerance))
+
+    def threshold(self, low, high):
+        rows, cols = self.box()
+        lum = app.img.luminance()[rows, cols]  # cached until pixels change
+        self.set_mask(npmask.Mask.threshold(lum, rows, cols, low, high))
 
     def __str__(self):
         return f"selection geom: {self.geometry}"
+
+#  ------------------------------------------
+#  Preview
+#  ------------------------------------------
+
+
+class Preview:
+    '''
+    run selection command on displayed (downsampled) view
+    while its parameters are tuned in slider dialog,
+    full resolution is processed after confirmation
+    whole: func works on whole view, may change its shape (rotate)
+    '''
+
+    def __init__(self, master, func, whole=False):
+        self.master = master
+        self.func = func
+        self.answers = []  # confirmed parameters
+        self.view = master.view_array()
+        self.view_slice = None if whole else self._view_slice(master.img.slice, master.zoom)
+        self.view_mask = None
+        mask = master.img.mask
+        if mask is not None and not whole:  # every zoom-th pixel, as view_slice
+            z = master.zoom
+            self.view_mask = mask.mask[-mask.rows.start % z::z, -mask.cols.start % z::z]
+
+    @staticmethod
+    def _view_slice(img_slice, zoom):
+        ''' image selection -> slice of view (every zoom-th pixel) '''
+        def scaled(s):
+            start = None if s.start is None else -(-s.start // zoom)
+            stop = None if s.stop is None else -(-s.stop // zoom)
+            return slice(start, stop)
+        return np.s_[scaled(img_slice[0]), scaled(img_slice[1]), ...]
+
+    def askfloat(self, prompt, **kw):
+        try:
+            value = npgui.askfloat_preview(prompt, preview=self.render, **kw)
+        except npgui.dialogException:
+            self.master.refresh("image")  # remove preview
+            raise
+        self.answers.append(value)
+        return value
+
+    def render(self, value):
+        t0 = time.perf_counter()
+        whole = self.view_slice is None
+        y = self.view if whole else self.view[self.view_slice].copy()
+        try:
+            with npparams.Replay(self.answers + [value], scale=self.master.zoom):
+                y = self.func(y)
+        except Exception as e:
+            logging.info(f"preview failed: {e}")
+            return
+        if y is None:
+            return
+        if whole:
+            view = y
+        else:
+            view = self.view.copy()
+            if self.view_mask is None:
+                view[self.view_slice] = y
+            else:
+                box = view[self.view_slice]
+                where = self.view_mask if box.ndim == 2 else self.view_mask[..., None]
+                np.copyto(box, y, where=where)
+        self.master.draw(view)
+        logging.info(f"preview {self.func.__name__} {value} in {time.perf_counter() - t0:.3f}s")
 #  ------------------------------------------
 #  MAIN
 #  ------------------------------------------
@@ -870,10 +1616,11 @@ if __name__ == '__main__':
     root.title("Npyshop")
     root.withdraw()  # root win is hidden
 
+    STARTUP["tk"] = time.perf_counter()
     app = App(root, img_path=Fp)
     app.focus_set()
-
-    logging.info(f"mainloop in {time.time()-time0}")
+    STARTUP["window"] = time.perf_counter()
+    app.after_idle(startup_report)  # after first draw, scheduled by App
 
     root.mainloop()
     
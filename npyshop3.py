@@ -234,7 +234,7 @@ def toggle_original():
         app.img.arr = app.history.original.copy()
     else:
         logging.info("show last")
-        app.img.arr = app.history.last()['arr'].copy()
+        app.img.arr = app.history.last()['state'].copy()
 
     app.history.toggle_original = not app.history.toggle_original
     app.update()
@@ -248,7 +248,7 @@ def undo():
     logging.info("undo")
     prev = app.history.undo()
     if prev:
-        app.img.arr = prev['arr'].copy()
+        app.img.arr = prev['state'].copy()
         app.update()
         app.histwin.update()
         app.statswin.update()
@@ -258,7 +258,7 @@ def redo():
     logging.info("redo")
     nex = app.history.redo()
     if nex:
-        app.img.arr = nex['arr'].copy()
+        app.img.arr = nex['state'].copy()
         app.update()
         app.histwin.update()
         app.statswin.update()
@@ -14,7 +14,10 @@ setup(
     author_email='ffsedd@gmail.com',
     description='python image editor',
     packages=find_packages(where=''),  # Required
+    py_modules=[os.path.splitext(f)[0] for f in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                if f.endswith(".py") and f != "setup.py"],
+    entry_points={"console_scripts": ["npbatch = npbatch:main"]},
     #scripts=['qq'],
-    install_requires=['send2trash', 'pillow', 'numpy'],
+    install_requires=['send2trash', 'pillow', 'numpy', 'imageio', 'scipy', 'scikit-image'],
     include_package_data=True,
 )
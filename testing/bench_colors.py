@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+''' compare npcolors conversions with matplotlib.colors (time, max difference)
+run from repository root: python3 -m testing.bench_colors
+'''
+import time
+
+import numpy as np
+from matplotlib import colors
+
+import npcolors
+
+
+def bench(f, *args, repeat=3, **kwargs):
+    ''' best of repeat, seconds '''
+    best = float("inf")
+    for _ in range(repeat):
+        bt = time.perf_counter()
+        r = f(*args, **kwargs)
+        best = min(best, time.perf_counter() - bt)
+    return best, r
+
+
+def main(size=(2000, 3000)):
+    rng = np.random.default_rng(0)
+    rgb = rng.random((*size, 3))
+    rgb[:100] = rgb[:100, :, :1]  # gray pixels (s = 0)
+    print(f"image {size[1]} x {size[0]} float64")
+
+    t_ref, hsv_ref = bench(colors.rgb_to_hsv, rgb)
+    t_new, hsv_new = bench(npcolors.rgb_to_hsv, rgb)
+    out = np.empty_like(rgb)
+    t_out, _ = bench(npcolors.rgb_to_hsv, rgb, out=out)
+    t_32, hsv_32 = bench(npcolors.rgb_to_hsv, rgb, dtype=np.float32)
+    print(f"rgb_to_hsv  matplotlib {t_ref:.3f}s  npcolors {t_new:.3f}s  "
+          f"out= {t_out:.3f}s  float32 {t_32:.3f}s  "
+          f"diff {np.abs(hsv_ref - hsv_new).max():.2e}")
+
+    t_ref, rgb_ref = bench(colors.hsv_to_rgb, hsv_ref)
+    t_new, rgb_new = bench(npcolors.hsv_to_rgb, hsv_ref)
+    t_out, _ = bench(npcolors.hsv_to_rgb, hsv_ref, out=out)
+    t_32, _ = bench(npcolors.hsv_to_rgb, hsv_32, dtype=np.float32)
+    print(f"hsv_to_rgb  matplotlib {t_ref:.3f}s  npcolors {t_new:.3f}s  "
+          f"out= {t_out:.3f}s  float32 {t_32:.3f}s  "
+          f"diff {np.abs(rgb_ref - rgb_new).max():.2e}")
+
+
+if __name__ == '__main__':
+    main()
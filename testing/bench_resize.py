@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+''' compare npgeometry.resize with PIL float resize (time, max difference)
+area is checked at integer factors only - at fractional scales PIL BOX
+takes whole pixels by their centers, area weights partly covered ones
+run from repository root: python3 -m testing.bench_resize
+'''
+import numpy as np
+from PIL import Image
+
+import npgeometry
+from testing.bench_colors import bench
+
+TOLERANCE = 1e-5
+PIL_FILTERS = {"area": Image.BOX,
+               "bilinear": Image.BILINEAR,
+               "lanczos": Image.LANCZOS,
+               }
+
+
+def pil_resize(y, shape, method):
+    ''' resize each channel as PIL "F" image '''
+    channels = y.reshape(*y.shape[:2], -1).transpose(2, 0, 1)
+    return np.stack([np.asarray(Image.fromarray(ch, mode="F").resize(
+        shape[::-1], PIL_FILTERS[method])) for ch in channels], axis=-1).reshape(
+            *shape, *y.shape[2:])
+
+
+def main(size=(1200, 1800)):
+    rng = np.random.default_rng(0)
+    y = rng.random((*size, 3), dtype=np.float32)
+    print(f"image {size[1]} x {size[0]} float32")
+
+    cases = [("area", f) for f in (2, 3, 4, 8)]  # integer factors only
+    cases += [(m, f) for m in ("bilinear", "lanczos") for f in (2, 2.5, 3.7)]
+    failed = []
+    for method, factor in cases:
+        shape = (int(round(size[0] / factor)), int(round(size[1] / factor)))
+        t_ref, ref = bench(pil_resize, y, shape, method)
+        t_new, new = bench(npgeometry.resize, y, shape, method=method)
+        if method == 'lanczos':  # npgeometry clips overshoot
+            ref = np.clip(ref, 0, 1)
+        diff = np.abs(ref - new).max()
+        print(f"{method:9} 1/{factor:<4} PIL {t_ref:.3f}s  npgeometry {t_new:.3f}s  "
+              f"diff {diff:.2e}")
+        if diff > TOLERANCE:
+            failed.append(f"{method} 1/{factor}")
+    if failed:
+        raise SystemExit(f"differs from PIL: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
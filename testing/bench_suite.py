@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+''' benchmarks of hot paths on synthetic images, results saved as json
+to track regressions between versions
+run from repository root:
+    python3 -m testing.bench_suite -o bench.json
+    python3 -m testing.bench_suite --sizes 1 --compare bench.json
+'''
+import argparse
+import inspect
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import npbatch
+import npcolors
+import npfilters
+import nphistory
+import npimage
+import skimage_exposure
+
+SIZES = (1, 10, 50)  # megapixels
+DTYPES = ("uint8", "uint16")
+CHANNELS = (1, 3)
+REPEAT = 3
+SLOWER = 1.2  # --compare: flagged when time ratio is above
+MIN_SECONDS = 1e-3  # --compare: faster cases are timer noise, not flagged
+
+# arguments of npfilters functions, functions not listed are called with y only
+FILTER_ARGS = {
+    "gamma": (.8,),
+    "gaussian": (3,),
+    "box_gaussian": (3,),
+    "pyramid_gaussian": (60,),
+    "unsharp_mask": (2, .5),
+    "contrast": (1.2,),
+    "multiply": (1.1,),
+    "fill": (.5,),
+    "add": (.1,),
+    "tres_high": (.5,),
+    "tres_low": (.5,),
+    "clip_high": (.9,),
+    "clip_low": (.1,),
+    "high_pass": (3,),
+}
+NOT_FILTERS = ("clip_result", "per_channel", "apply_to_value", "tone")
+
+
+def synthetic(megapixels, dtype="uint8", channels=3, seed=0):
+    ''' 4:3 image, gradients and noise (not constant - fair for codecs and histograms) '''
+    h = int(np.sqrt(megapixels * 1e6 * 3 / 4))
+    w = int(megapixels * 1e6 / h)
+    rng = np.random.default_rng(seed)
+    r = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+    c = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+    planes = [(r * c), (1 - r) * c, r * (1 - c)][:channels]
+    arr = np.stack(planes, axis=-1) if channels > 1 else planes[0]
+    arr = arr * .8 + rng.random(arr.shape, dtype=np.float32) * .2
+    maxval = np.iinfo(dtype).max
+    return (arr * maxval).astype(dtype)
+
+
+def bench(func, setup=None, repeat=REPEAT):
+    ''' seconds of each run, setup() is not timed '''
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def filter_functions():
+    ''' public npfilters functions (filters of image array) '''
+    return {name: f for name, f in inspect.getmembers(npfilters, inspect.isfunction)
+            if f.__module__ == npfilters.__name__
+            and not name.startswith("_") and name not in NOT_FILTERS}
+
+
+def cases(raw, tmp):
+    ''' (group, name, func, setup) of one image '''
+    ext = ".png" if raw.dtype == np.uint8 else ".tif"  # 16 bit rgb png not written by PIL
+    fpath = Path(tmp) / f"bench{ext}"
+    npimage.npImage()._save_image(raw / np.iinfo(raw.dtype).max, fpath,
+                                  bitdepth=raw.dtype.itemsize * 8)
+    img = npimage.npImage(img_path=fpath)
+    y = img.arr
+    saved = itertools.count()  # new file each run, save trashes existing
+
+    yield "io", "load", lambda: npimage.npImage(img_path=fpath), None
+    yield "io", "save", lambda: img.save(Path(tmp) / f"out{next(saved)}{ext}"), None
+
+    for name, f in filter_functions().items():
+        args = FILTER_ARGS.get(name, ())
+        yield "filters", name, lambda f=f, args=args: f(y, *args), None
+
+    if y.ndim == 3:
+        hsv = npcolors.rgb_to_hsv(y)
+        yield "colors", "rgb_to_hsv", lambda: npcolors.rgb_to_hsv(y), None
+        yield "colors", "hsv_to_rgb", lambda: npcolors.hsv_to_rgb(hsv), None
+        yield "colors", "luminance", img.luminance, img.changed
+        yield "colors", "color_model_change", lambda: (
+            img.color_model_change("hsv"), img.color_model_change("rgb")), img.changed
+
+    history = nphistory.History(max_length=10)
+    yield "history", "add_snapshot", lambda: history.add(img.snapshot(), "bench"), None
+    yield "history", "add_array", lambda: history.add(y, "bench"), None
+    history = nphistory.History(max_length=10)
+    history.add(img.snapshot(), "load")
+    yield "history", "undo", lambda: img.restore(history.undo()["state"]), \
+        lambda: history.add(img.snapshot(), "bench")
+
+    yield "histogram", "histogram", lambda: skimage_exposure.histogram(y, 256), None
+    yield "histogram", "cumulative_distribution", \
+        lambda: skimage_exposure.cumulative_distribution(y, 256), None
+    yield "histogram", "stats", lambda: img.stats, None
+
+    zoom = max(1, min(img.width // 2 ** 9, img.height // 2 ** 9))  # as App
+    yield "render", f"view_zoom{zoom}", lambda: img.view(zoom), img.changed
+    yield "render", "make_image_view", lambda: make_image_view(img, zoom), img.changed
+
+
+def make_image_view(img, zoom, gamma=.9):
+    ''' pixel path of App._make_image_view (PhotoImage needs display) '''
+    import npyshop
+    view = npfilters.gamma(img.view(zoom), gamma)
+    return npyshop.view_image(view)
+
+
+def version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=SIZES, dtypes=DTYPES, channels=CHANNELS, repeat=REPEAT, only=None):
+    ''' results of all cases, images over memory budget are skipped '''
+    budget = npbatch.physical_memory() * npbatch.MEMORY_FRACTION
+    results = []
+    for mp in sizes:
+        for dtype in dtypes:
+            for ch in channels:
+                label = f"{mp:g}MP {dtype} {'rgb' if ch == 3 else 'gray'}"
+                need = mp * 1e6 * ch * 8 * npbatch.WORK_COPIES
+                if need > budget:
+                    print(f"{label}: skipped, needs {need / 2**30:.1f} GB")
+                    results.append({"image": label, "skipped": "memory"})
+                    continue
+                raw = synthetic(mp, dtype, ch)
+                with tempfile.TemporaryDirectory() as tmp:
+                    for group, name, func, setup in cases(raw, tmp):
+                        if only and only not in f"{group}.{name}":
+                            continue
+                        with np.errstate(divide="ignore", invalid="ignore"):
+                            runs = bench(func, setup, repeat)
+                        results.append({"image": label, "shape": raw.shape,
+                                        "group": group, "name": name,
+                                        "best": min(runs), "median": statistics.median(runs),
+                                        "runs": runs})
+                        print(f"{label:18} {group:10} {name:26} {min(runs):8.4f}s")
+                del raw
+    return {"meta": {"version": version(),
+                     "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                     "python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "platform": platform.platform(),
+                     "cpus": os.cpu_count(),
+                     "repeat": repeat},
+            "results": results}
+
+
+def compare(report, baseline):
+    ''' print time ratios to baseline report, returns count of slower cases '''
+    def key(r):
+        return r["image"], r.get("group"), r.get("name")
+    old = {key(r): r for r in baseline["results"] if "best" in r}
+    slower = 0
+    for r in report["results"]:
+        b = old.get(key(r))
+        if "best" not in r or not b:
+            continue
+        ratio = r["best"] / b["best"] if b["best"] else float("inf")
+        flag = "SLOWER" if ratio > SLOWER and r["best"] > MIN_SECONDS else ""
+        slower += bool(flag)
+        print(f"{r['image']:18} {r['group']:10} {r['name']:26} "
+              f"{b['best']:8.4f}s -> {r['best']:8.4f}s  x{ratio:5.2f} {flag}")
+    print(f"compared to {baseline['meta'].get('version')}: {slower} slower")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="npyshop benchmarks")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES, help="megapixels")
+    parser.add_argument("--dtypes", nargs="+", default=DTYPES, choices=DTYPES)
+    parser.add_argument("--channels", type=int, nargs="+", default=CHANNELS, choices=CHANNELS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", help="run cases containing text, eg. 'filters.gauss'")
+    parser.add_argument("-o", "--output", help="json results")
+    parser.add_argument("--compare", help="json results of previous run")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.dtypes, args.channels, args.repeat, args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            return 1 if compare(report, json.load(f)) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,2 @@
-import time
-from functools import update_wrapper
-
-
-def decorator(d):
-    "Make function d a decorator: d wraps a function fn."
-    def _d(fn):
-        return update_wrapper(d(fn), fn)
-    update_wrapper(_d, d)
-    return _d
-
-
-@decorator
-def timeit(f):
-    """time a function, used as decorator"""
-    def new_f(*args, **kwargs):
-        bt = time.time()
-        r = f(*args, **kwargs)
-        et = time.time()
-        print(f"timeit: {f.__qualname__}: {et - bt:.2f}s")
-        return r
-    return new_f
\ No newline at end of file
+''' kept for old scripts, timing is done by npprofile (spans, no prints) '''
+from npprofile import timed as timeit  # noqa: F401